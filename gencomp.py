@@ -16,25 +16,37 @@
 #
 # texture data format: 
 # 1 byte, char: number of contained glyphs n
+# 1 byte, char: coordinate encoding e (0: f16, 1: u16, 2: u8)
 # 2 byte, short: size of the glyphs
 # 
 # TODO: add a separate glyph index here to speed up letter rendering
 # for each contained glyph:
 #     1 byte, char value: character index in ascii
+#     2 bytes, short value: offset of the glyph data
+# for each contained glyph:
 #     2 bytes, short value: glyph point data length m
-#     2*m bytes, float16 values: glyph x data
-#     2*m bytes, float16 values: glyph y data
+#     for the integer encodings:
+#         2*2 bytes, short values: lower corner of the glyph
+#     w*m bytes: glyph x data, relative to the lower corner for integer encodings
+#     w*m bytes: glyph y data, relative to the lower corner for integer encodings
 #     m bytes, char values: outline tags
 #     1 byte, char value: number of contours o in glyph outline
 #     2*o bytes, short values: contour end points
-# 1 byte: 0
+# zeros up to the next 4-byte-block
 #
-# this means, the length of the texture array is
-# (2 + n * (4 + 5*m + 2*o))/2
+# where w is the width of the encoding (2 bytes for f16 and u16, 1 byte for
+# u8). This means, the length of the texture array is
+# 4 + 3*n + sum over glyphs (3 + 4*[integer encoding] + (2*w+1)*m + 2*o)
+# bytes before padding.
 # 
+# Without a given size, the char size and encoding are optimized: for every
+# candidate char size, the glyph points are compared with the unscaled
+# outline in units of the em size after the quantization of each encoding,
+# and the smallest texture with a maximum error below the bound wins.
 
 import argparse
 import freetype
+import multiprocessing
 import numpy as np
 import struct
 import sys
@@ -44,112 +56,253 @@ def close(str):
     print(str)
     exit()
 
-# CMD arg parser
-parser = argparse.ArgumentParser(description='Memory Texture Text Generation Tool by Team210.')
-parser.add_argument('-f', '--fontfile', dest='fontfile')
-parser.add_argument('-o', '--output', dest='outfile')
-args, rest = parser.parse_known_args()
-
-# Check args for consistency
-text = ""
-if rest != []:
-    text = list(set(rest[0]))
-    print("Unique character list is:", text)
-else:
-    text = [ chr(i) for i in range(32,127) ]
-    print("No text specified. Taking standard character list:", text)
-write_file = True
-if args.fontfile == None:
-    close("No font file specified. Doing nothing.")
-if args.outfile == None:
-    print("No output file selected. Writing to stdout instead.")
-    write_file = False
-
-# Open font file
-font = freetype.Face(args.fontfile)
-
-# Specify format
-ftype = '>h'
-
-# Pack the texture
-def pack_texture(size):
-    global font, text
-    # Process text
-    data = []
-    lengths = []
-    for char in text:
-        print("Processing char: "+char)
-        
-        # Load glyph outline
-        font.load_char(char)
-        glyph = font.glyph
-        outline = glyph.outline
-        
-        # Get outline points
-        points = np.array(outline.points, dtype=[('x',float), ('y',float)]) 
-        x = list(points['x'])
-        y = list(points['y'])
-        
-        # pack glyph data
-        n = len(x)
-        ncont = len(outline.contours)
-
-        glyph_data = struct.pack('H', n)
-        fmt = '{:d}e'.format(n)
-        if n != 0:
-            glyph_data += struct.pack(fmt, *x)
-            glyph_data += struct.pack(fmt, *y)
-            glyph_data += struct.pack('{:d}B'.format(n), *outline.tags)
-        glyph_data += struct.pack('B', ncont)
-        if ncont != 0:
-            glyph_data += struct.pack('{:d}H'.format(ncont), *outline.contours)
-        
-        data += [ glyph_data ]
-        lengths += [ len(glyph_data) ]
+# Coordinate encodings with their struct format characters and value ranges
+encodings = [ 'f16', 'u16', 'u8' ]
+encoding_formats = { 'f16': 'e', 'u16': 'H', 'u8': 'B' }
+encoding_ranges = { 'f16': 65504, 'u16': 65535, 'u8': 255 }
+
+# Load the outline points of a glyph as int array of shape (m,2). Hinting
+# would move the points depending on the char size, so it is disabled.
+def load_points(font, char, flags=freetype.FT_LOAD_NO_HINTING):
+    font.load_char(char, flags)
+    return np.array(font.glyph.outline.points, dtype=int).reshape(-1, 2)
+
+# Pack the outline of a single glyph
+def pack_glyph(font, char, encoding='f16'):
+    # Load glyph outline
+    points = load_points(font, char)
+    outline = font.glyph.outline
+    
+    # pack glyph data
+    n = len(points)
+    ncont = len(outline.contours)
+
+    glyph_data = struct.pack('H', n)
+    if encoding != 'f16':
+        lower = points.min(axis=0) if n != 0 else np.zeros(2, dtype=int)
+        glyph_data += struct.pack('2h', *lower)
+        points = points-lower
+    fmt = '{:d}'.format(n) + encoding_formats[encoding]
+    if n != 0:
+        glyph_data += struct.pack(fmt, *points[:,0].tolist())
+        glyph_data += struct.pack(fmt, *points[:,1].tolist())
+        glyph_data += struct.pack('{:d}B'.format(n), *outline.tags)
+    glyph_data += struct.pack('B', ncont)
+    if ncont != 0:
+        glyph_data += struct.pack('{:d}H'.format(ncont), *outline.contours)
+    return glyph_data
+
+# Open font file. An open freetype.Face is used as it is, after setting its
+# char size.
+def open_font(font, size):
+    if not isinstance(font, freetype.Face):
+        font = freetype.Face(font)
+    font.set_char_size(size)
+    return font
+
+# Each worker process opens its own font face.
+worker_font = None
+worker_encoding = None
+def init_worker(fontfile, size, encoding):
+    global worker_font, worker_encoding
+    worker_font = open_font(fontfile, size)
+    worker_encoding = encoding
+
+def pack_worker(char):
+    return pack_glyph(worker_font, char, worker_encoding)
+
+# Pack the texture from font, a font file name or an open freetype.Face.
+# With jobs > 1, the glyphs of a font file are packed by worker processes;
+# the glyph data is merged in the order of text, so the result does not
+# depend on the number of jobs. With verbose set, the glyph index is printed.
+def pack_texture(font, text, size, encoding='f16', jobs=1, verbose=False):
+    if verbose:
+        print("Processing chars: "+''.join(text))
+    if jobs > 1 and len(text) > 1 and not isinstance(font, freetype.Face):
+        with multiprocessing.Pool(min(jobs, len(text)), init_worker, (font, size, encoding)) as pool:
+            data = pool.map(pack_worker, text, chunksize=max(1, len(text)//(4*jobs)))
+    else:
+        font = open_font(font, size)
+        data = [ pack_glyph(font, char, encoding) for char in text ]
+    lengths = [ len(glyph_data) for glyph_data in data ]
     
-    # 1 Byte, char: Number of contained glyphs
-    texture = struct.pack('B', len(text))
+    # 1 Byte, char: Number of contained glyphs; 1 Byte, char: encoding; 2 Bytes, short: size
+    texture = struct.pack('BBH', len(text), encodings.index(encoding), size)
     
     # Pack index
-    offset = 1+3*len(text)
-    print("Index:")
+    offset = 4+3*len(text)
+    if verbose:
+        print("Index:")
     for i in range(len(text)):
-    texture += struct.pack('B', ord(text[i]))
-    texture += struct.pack('H', offset)
-    offset += lengths[i]
-    print("> '"+text[i]+"' - "+str(lengths[i])+" bytes at "+str(offset)) 
+        texture += struct.pack('B', ord(text[i]))
+        texture += struct.pack('H', offset)
+        offset += lengths[i]
+        if verbose:
+            print("> '"+text[i]+"' - "+str(lengths[i])+" bytes at "+str(offset)) 
     
     # Pack data
-    for i in range(len(text)):
-        texture += data[i]
+    texture += b''.join(data)
+    # Fill last 4-byte-block with zero
+    texture += bytes(-len(texture) % 4)
     return texture
 
-# Function to minimize
-def f(size):
+# Length of the packed texture in bytes for glyphs with the given numbers of
+# points and contours
+def texture_length(npoints, ncontours, encoding):
+    npoints = np.asarray(npoints)
+    width = struct.calcsize(encoding_formats[encoding])
+    length = 4 + 3*len(npoints) + np.sum(3 + 4*(encoding != 'f16') + (2*width+1)*npoints + 2*np.asarray(ncontours))
+    return int(length + (-length) % 4)
+
+# Largest value the glyph points take in the encoding, to be compared with
+# its value range: the absolute coordinates for f16, the coordinates relative
+# to the lower corner of their glyph for the integer encodings. glyph holds
+# the glyph number of every point. Lower corners that do not fit into the
+# signed shorts of the glyph data give an infinite extent.
+def encoding_extent(points, glyph, nglyphs, encoding):
+    if len(points) == 0:
+        return 0.
+    if encoding == 'f16':
+        return np.abs(points).max()
+    lower = np.full((nglyphs, 2), np.inf)
+    np.minimum.at(lower, glyph, points)
+    lower = lower[glyph]
+    if lower.min() < -32768 or lower.max() > 32767:
+        return np.inf
+    return (points-lower).max()
+
+# Check whether the glyphs of text at char size fit into the value range of
+# encoding. font is a font file name or an open freetype.Face.
+def fits_encoding(font, text, size, encoding):
+    font = open_font(font, size)
+    points = [ load_points(font, char) for char in text ]
+    glyph = np.concatenate([ [ i ]*len(p) for i, p in enumerate(points) ] + [ [] ]).astype(int)
+    points = np.concatenate(points + [ np.zeros((0,2), dtype=int) ])
+    return encoding_extent(points, glyph, len(text), encoding) <= encoding_ranges[encoding]
+
+# Maximum distance between the quantized glyph points at char size and the
+# unscaled outline reference (in em units) for each encoding. glyph holds the
+# glyph number of every reference point. Encodings whose value range is
+# exceeded get an infinite error.
+def quantization_errors(font, text, size, reference, glyph):
     font.set_char_size(size)
-    texture = pack_texture(size)
-
-# Pack glyphs for specified alphabet into binary sequence
-texture = pack_texture(font, text, size)
-
-length = int(size/2)
-texs = str(int(np.ceil(np.sqrt(float(size)/4.))))
-
-print("packed font is "+str(size)+" bytes.")
-print("Required texture size:" + texs)
-
-array = struct.unpack('{:d}h'.format(length), texture)
-text = "//Generated by tx210 (c) 2018 NR4/Team210\n\n#ifndef FONT_H\n#define FONT_H\n\n"
-text += "const short font_texture[{:d}]".format(length)+" = {"
-for val in array[:-1]:
-    text += str(val) + ',' 
-text += str(array[-1]) + '};\n'
-text += "const int font_texture_size = " + str(texs) + ";"
-text += '\n#endif\n'
-
-if write_file:
-    with open(args.outfile, "wt") as f:
-        f.write(text)
-        f.close()
-else:
-    print(text)
+    points = [ load_points(font, char) for char in text ]
+    if sum(len(p) for p in points) != len(reference):
+        return { encoding: np.inf for encoding in encodings }
+    points = np.concatenate(points).astype(float)
+    
+    errors = {}
+    for encoding in encodings:
+        # Points are integer already for the integer encodings
+        decoded = points.astype(np.float16).astype(float) if encoding == 'f16' else points
+        if encoding_extent(points, glyph, len(text), encoding) > encoding_ranges[encoding]:
+            errors[encoding] = np.inf
+            continue
+        distance = np.linalg.norm(decoded/float(size)-reference, axis=1)
+        errors[encoding] = distance.max() if len(distance) != 0 else 0.
+    return errors
+
+# Search the char sizes and encodings for the smallest texture whose maximum
+# geometric error does not exceed maxerror (in em units). font is a font file
+# name or an open freetype.Face. Returns size, encoding, texture length and
+# error of the best candidate, or None. With verbose set, the errors of every
+# size are printed.
+def optimize(font, text, maxerror, sizes=np.unique(np.geomspace(64, 65535, 48).astype(int)), verbose=False):
+    if not isinstance(font, freetype.Face):
+        font = freetype.Face(font)
+    
+    # Unscaled reference outline and the glyph counts, which do not depend on
+    # the size
+    reference = []
+    glyph = []
+    npoints = []
+    ncontours = []
+    for i in range(len(text)):
+        points = load_points(font, text[i], freetype.FT_LOAD_NO_SCALE)
+        reference += [ points/float(font.units_per_EM) ]
+        glyph += [ i ]*len(points)
+        npoints += [ len(points) ]
+        ncontours += [ len(font.glyph.outline.contours) ]
+    reference = np.concatenate(reference) if reference != [] else np.zeros((0,2))
+    glyph = np.array(glyph, dtype=int)
+    lengths = { encoding: texture_length(npoints, ncontours, encoding) for encoding in encodings }
+    
+    best = None
+    for size in sizes:
+        errors = quantization_errors(font, text, int(size), reference, glyph)
+        if verbose:
+            print("size {:6d}: ".format(int(size)) + ", ".join("{:s} {:.2e}".format(encoding, errors[encoding]) for encoding in encodings))
+        for encoding in encodings:
+            if errors[encoding] > maxerror:
+                continue
+            candidate = (lengths[encoding], errors[encoding], int(size), encoding)
+            if best == None or candidate < best:
+                best = candidate
+    if best == None:
+        return None
+    return best[2], best[3], best[0], best[1]
+
+if __name__ == '__main__':
+    # CMD arg parser
+    parser = argparse.ArgumentParser(description='Memory Texture Text Generation Tool by Team210.')
+    parser.add_argument('-f', '--fontfile', dest='fontfile')
+    parser.add_argument('-o', '--output', dest='outfile')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1, help='Number of worker processes for glyph packing.')
+    parser.add_argument('-e', '--max-error', dest='maxerror', type=float, default=1.e-3, help='Maximum geometric error in em units.')
+    parser.add_argument('-s', '--size', dest='size', type=int, help='Char size; skips the optimization.')
+    parser.add_argument('--encoding', dest='encoding', default='f16', choices=encodings, help='Coordinate encoding for a given char size.')
+    args, rest = parser.parse_known_args()
+
+    # Check args for consistency
+    text = ""
+    if rest != []:
+        text = sorted(set(rest[0]))
+        print("Unique character list is:", text)
+    else:
+        text = [ chr(i) for i in range(32,127) ]
+        print("No text specified. Taking standard character list:", text)
+    write_file = True
+    if args.fontfile == None:
+        close("No font file specified. Doing nothing.")
+    if args.outfile == None:
+        print("No output file selected. Writing to stdout instead.")
+        write_file = False
+
+    # Find char size and encoding
+    size = args.size
+    encoding = args.encoding
+    if size == None:
+        best = optimize(args.fontfile, text, args.maxerror, verbose=True)
+        if best == None:
+            close("No char size and encoding meets the error bound.")
+        size, encoding, length, error = best
+        print("Selected char size "+str(size)+" with "+encoding+" encoding, maximum error {:.2e}.".format(error))
+    elif size < 1 or size > 65535:
+        close("Char size "+str(size)+" does not fit into the 16 bit size field of the texture header.")
+    elif not fits_encoding(args.fontfile, text, size, encoding):
+        close("Glyph coordinates at char size "+str(size)+" exceed the value range of the "+encoding+" encoding.")
+
+    # Pack glyphs for specified alphabet into binary sequence
+    texture = pack_texture(args.fontfile, text, size, encoding, args.jobs, verbose=True)
+
+    length = int(len(texture)/2)
+    texs = str(int(np.ceil(np.sqrt(float(len(texture))/4.))))
+
+    print("packed font is "+str(len(texture))+" bytes.")
+    print("Required texture size:" + texs)
+
+    array = struct.unpack('{:d}h'.format(length), texture)
+    text = "//Generated by tx210 (c) 2018 NR4/Team210\n\n#ifndef FONT_H\n#define FONT_H\n\n"
+    text += "const short font_texture[{:d}]".format(length)+" = {"
+    for val in array[:-1]:
+        text += str(val) + ',' 
+    text += str(array[-1]) + '};\n'
+    text += "const int font_texture_size = " + str(texs) + ";"
+    text += '\n#endif\n'
+
+    if write_file:
+        with open(args.outfile, "wt") as f:
+            f.write(text)
+            f.close()
+    else:
+        print(text)
@@ -17,11 +17,27 @@
 
 #version 130
 
+// Define FONT_UINT as 1 or 4 for font textures of tx210's r16ui or rgba16ui
+// layout, with 1 or 4 shorts per texel of an unsigned integer texture.
+// #define FONT_UINT 1
+// Define FONT_SDF for textures of tx210's sdf record format. Its atlas is a
+// second sampler, iFontSDF, which the host has to bind to texture unit 1
+// (glUniform1i of iFontSDF to 1); the font texture stays on unit 0.
+// #define FONT_SDF
+
 // Uniforms
 uniform float iTime;
 uniform vec2 iResolution;
+#ifdef FONT_UINT
+uniform usampler2D iFont;
+#else
 uniform sampler2D iFont;
+#endif
 uniform float iFontWidth;
+#ifdef FONT_SDF
+uniform sampler2D iFontSDF;
+uniform vec2 iFontSDFSize;
+#endif
 
 // Global constants
 const vec3 c = vec3(1.,0.,-1.);
@@ -30,6 +46,9 @@ const float pi = acos(-1.);
 // Global variables
 float size = 1.;
 vec2 carriage = vec2(0.,0.);
+// Distance beyond which dglyph may return the bounding box distance instead
+// of the exact distance; has to cover stroke width and antialiasing.
+float bboxmargin = .01;
 
 // Add objects to scene with proper antialiasing
 vec4 add(vec4 sdf, vec4 sda)
@@ -92,7 +111,7 @@ float spline2(vec2 p0, vec2 p1, vec2 p2, vec2 x)
 // add sign to polygon distance
 float intersector(vec2 p0, vec2 p1, vec2 x)
 {
-    if(step(p0.y,x.y)*step(x.y,p1.y) == 0)return 0;
+    if(step(min(p0.y,p1.y),x.y)*step(x.y,max(p0.y,p1.y)) == 0.)return 0.;
 
     vec2 k = x-p0, d = p1-p0;
     if(d.y == 0.) return 0.;
@@ -140,6 +159,22 @@ float intersector(vec2 p0, vec2 p1, vec2 p2, vec2 x)
     return 0.;
 }
 
+#ifdef FONT_UINT
+// Read short value from the integer texture at index off. Every fetch is a
+// single exact integer read; the texture width is taken from the texture.
+float rshort(float off)
+{
+    int i = int(off),
+        texel = i/FONT_UINT,
+        width = textureSize(iFont, 0).x;
+    uvec4 block = texelFetch(iFont, ivec2(texel%width, texel/width), 0);
+#if FONT_UINT == 4
+    return float(block[i%4]);
+#else
+    return float(block.r);
+#endif
+}
+#else
 // Read short value from texture at index off
 float rshort(float off)
 {
@@ -167,29 +202,332 @@ float rshort(float off)
     // of 65535 minus the lower 255.
     return round(dot(vec2(255., 65280.), data));
 }
+#endif
 
-// Compute distance to glyph from ascii value out of the font texture.
-// This function parses glyph point and control data and computes the correct
-// Spline control points. Then it uses the signed distance function to
-// piecewise bezier splines to get a signed distance to the font glyph.
-float dglyph(vec2 x, int ascii)
+// Read the unsigned integer of width <= 16 bits at bit position pos. Bits are
+// stored least significant first, so a value spans at most two shorts.
+float rbits(float pos, float width)
 {
-    // Get glyph index length
-    float nchars = rshort(0.);
+    float off = floor(pos/16.);
+    uint word = uint(rshort(off)) | (uint(rshort(off+1.)) << 16u);
+    return float((word >> uint(mod(pos, 16.))) & ((1u << uint(width)) - 1u));
+}
+
+// Decode zigzag coded signed values: 0, 1, 2, 3, ... to 0, -1, 1, -2, ...
+float unzigzag(float v)
+{
+    return mod(v, 2.) == 1. ? -.5*(v+1.) : .5*v;
+}
+
+// Find the offset of the glyph data for ascii in the glyph index or return
+// -1 if the glyph is not present. Textures without header start with the
+// number of glyphs of a linear index; otherwise header is at least 32768
+// and its low four bits select the index type:
+//     0: linear, number of glyphs followed by (code point, offset) pairs
+//     1: direct, first code point, number of entries and one offset each
+//     2: paged, page shift, first page, number of pages, offsets of the
+//        leaf tables of the pages and the leaf tables themselves
+// The direct and paged indices resolve any code point with at most two
+// fetches after the header; unused entries hold zero. The index starts
+// after the header at start, the beginning of the font's section.
+float glyphoffset(float start, float header, int ascii)
+{
+    float base = start,
+        type = 0.,
+        a = float(ascii);
+    if(header >= 32768.)
+    {
+        base = start+1.;
+        type = mod(header, 16.);
+    }
     
-    // Find character in glyph index
-    float off = -1.;
+    // Direct-mapped table
+    if(type == 1.)
+    {
+        float i = a-rshort(base);
+        if(i < 0. || i >= rshort(base+1.)) return -1.;
+        float off = rshort(base+2.+i);
+        return off == 0. ? -1. : off;
+    }
+    
+    // Two-level paged table
+    if(type == 2.)
+    {
+        float pagesize = exp2(rshort(base)),
+            page = floor(a/pagesize)-rshort(base+1.);
+        if(page < 0. || page >= rshort(base+2.)) return -1.;
+        float leaf = rshort(base+3.+page);
+        if(leaf == 0.) return -1.;
+        float off = rshort(leaf+mod(a, pagesize));
+        return off == 0. ? -1. : off;
+    }
+    
+    // Linear scan
+    float nchars = rshort(base);
     for(float i=0.; i<nchars; i+=1.)
     {
-        int ord = int(rshort(1.+2.*i));
+        int ord = int(rshort(base+1.+2.*i));
         if(ord == ascii)
+            return rshort(base+2.+2.*i);
+    }
+    return -1.;
+}
+
+// Read a point of an explicit segment record. Coordinates are stored in units
+// of half a point, so implicit on-curve midpoints are exact.
+vec2 rpoint(float off, vec2 dx)
+{
+    return (.5*vec2(rshort(off), rshort(off+1.)) + dx)/65536.*size;
+}
+
+// Compute distance to glyph from a record of explicit segments. tx210 resolves
+// the implicit on-curve points and closes the contours offline, so the lines
+// and quadratic splines are iterated without reading tags or keeping a stack.
+float dsegments(vec2 x, float off)
+{
+    // Get short range offsets. Sign is read separately.
+    vec2 dx = mix(c.xx,c.zz,vec2(rshort(off), rshort(off+2.)))*vec2(rshort(off+1.), rshort(off+3.));
+    
+    float nlines = rshort(off+4.),
+        nquads = rshort(off+5.),
+        loff = off+6.,
+        qoff = off+6.+4.*nlines,
+        d = 1., n = 0.;
+    
+    for(float i=0.; i<nlines; i+=1.)
+    {
+        vec2 p0 = rpoint(loff, dx), p1 = rpoint(loff+2., dx);
+        d = min(d, lineseg(x, p0, p1));
+        n += intersector(p0, p1, x);
+        loff += 4.;
+    }
+    
+    for(float i=0.; i<nquads; i+=1.)
+    {
+        vec2 p0 = rpoint(qoff, dx), p1 = rpoint(qoff+2., dx), p2 = rpoint(qoff+4., dx);
+        d = min(d, spline2(p0, p1, p2, x));
+        n += intersector(p0, p1, p2, x);
+        qoff += 6.;
+    }
+    
+    return mix(d, -d, mod(n, 2.));
+}
+
+// Compute distance to glyph from a distance field record. The field is stored
+// in the single channel atlas iFontSDF of size iFontSDFSize, which has to be
+// sampled with linear filtering; the record holds the field origin, the grid
+// spacing and padding and the field's rectangle in the atlas. Outside of the
+// field, the distance to it is added to the closest sample.
+#ifdef FONT_SDF
+float dsdf(vec2 x, float off)
+{
+    // Get short range offset of the field origin. Sign is read separately.
+    vec2 dx = mix(c.xx,c.zz,vec2(rshort(off), rshort(off+2.)))*vec2(rshort(off+1.), rshort(off+3.)),
+        a = vec2(rshort(off+6.), rshort(off+7.)),
+        g = vec2(rshort(off+8.), rshort(off+9.));
+    float cell = rshort(off+4.), 
+        spread = rshort(off+5.)*cell;
+    
+    // Position on the sample grid
+    vec2 s = (x*65536./size-dx)/cell,
+        sc = clamp(s, c.yy, g-1.);
+    float d = (255.*texture(iFontSDF, (a+sc+.5)/iFontSDFSize).r-128.)/127.*spread + length(s-sc)*cell;
+    return d/65536.*size;
+}
+#endif
+
+// Compute distance to glyph from a bit packed record. The record holds the
+// short range offsets plus 32768, the number of points and contours and the
+// bit widths of the x and y differences and contour lengths (5 bits each),
+// followed by a bitstream of one bit per tag, the zigzag coded differences of
+// consecutive x and y values and the number of points per contour minus one.
+// Points are decoded in order, so the implicit on-curve midpoints are
+// resolved on the fly while walking each contour once.
+float dpacked(vec2 x, float off)
+{
+    vec2 dx = vec2(rshort(off), rshort(off+1.))-32768.;
+    float npts = rshort(off+2.),
+        ncont = rshort(off+3.),
+        widths = rshort(off+4.),
+        wx = mod(widths, 32.),
+        wy = mod(floor(widths/32.), 32.),
+        wc = floor(widths/1024.),
+        tpos = 16.*(off+5.),
+        xpos = tpos+npts,
+        ypos = xpos+npts*wx,
+        cpos = ypos+npts*wy,
+        j = 0.,
+        d = 1., n = 0.;
+    vec2 p = c.yy;
+    
+    for(float i=0.; i<ncont; i+=1.)
+    {
+        float iend = j+rbits(cpos+i*wc, wc);
+        
+        // Contours start with an on-curve point
+        p += vec2(unzigzag(rbits(xpos+j*wx, wx)), unzigzag(rbits(ypos+j*wy, wy)));
+        vec2 first = (p+dx)/65536.*size, last = first, control = first;
+        bool pending = false;
+        
+        for(j+=1.; j<=iend; j+=1.)
+        {
+            p += vec2(unzigzag(rbits(xpos+j*wx, wx)), unzigzag(rbits(ypos+j*wy, wy)));
+            vec2 q = (p+dx)/65536.*size;
+            if(rbits(tpos+j, 1.) == 1.)
+            {
+                if(pending)
+                {
+                    d = min(d, spline2(last, control, q, x));
+                    n += intersector(last, control, q, x);
+                }
+                else
+                {
+                    d = min(d, lineseg(x, last, q));
+                    n += intersector(last, q, x);
+                }
+                last = q;
+                pending = false;
+            }
+            else
+            {
+                if(pending)
+                {
+                    vec2 m = mix(control, q, .5);
+                    d = min(d, spline2(last, control, m, x));
+                    n += intersector(last, control, m, x);
+                    last = m;
+                }
+                control = q;
+                pending = true;
+            }
+        }
+        
+        // Close the contour
+        if(pending)
+        {
+            d = min(d, spline2(last, control, first, x));
+            n += intersector(last, control, first, x);
+        }
+        else
         {
-            off = rshort(1.+2.*i+1);
-            break;
+            d = min(d, lineseg(x, last, first));
+            n += intersector(last, first, x);
         }
     }
-    // Ignore characters that are not present in the glyph index.
-    if(off == -1.) return 1.;
+    
+    return mix(d, -d, mod(n, 2.));
+}
+
+// Compute distance to glyph from a record that refers to the contour pool.
+// The record holds the short range offset and the number of contours, then
+// per contour the offset of its pool entry and its translation. Each pool
+// entry holds the number of points, then the x values, y values and tags of
+// the contour, which starts with an on-curve point.
+float dpooled(vec2 x, float off)
+{
+    // Get short range offsets. Sign is read separately.
+    vec2 dx = mix(c.xx,c.zz,vec2(rshort(off), rshort(off+2.)))*vec2(rshort(off+1.), rshort(off+3.));
+    float ncont = rshort(off+4.),
+        d = 1., n = 0.;
+    
+    for(float i=0.; i<ncont; i+=1.)
+    {
+        float roff = off+5.+3.*i,
+            coff = rshort(roff),
+            npts = rshort(coff);
+        vec2 t = dx + vec2(rshort(roff+1.), rshort(roff+2.)),
+            first = (vec2(rshort(coff+1.), rshort(coff+1.+npts)) + t)/65536.*size, 
+            last = first, control = first;
+        bool pending = false;
+        
+        for(float j=1.; j<npts; j+=1.)
+        {
+            vec2 q = (vec2(rshort(coff+1.+j), rshort(coff+1.+npts+j)) + t)/65536.*size;
+            if(rshort(coff+1.+2.*npts+j) == 1.)
+            {
+                if(pending)
+                {
+                    d = min(d, spline2(last, control, q, x));
+                    n += intersector(last, control, q, x);
+                }
+                else
+                {
+                    d = min(d, lineseg(x, last, q));
+                    n += intersector(last, q, x);
+                }
+                last = q;
+                pending = false;
+            }
+            else
+            {
+                if(pending)
+                {
+                    vec2 m = mix(control, q, .5);
+                    d = min(d, spline2(last, control, m, x));
+                    n += intersector(last, control, m, x);
+                    last = m;
+                }
+                control = q;
+                pending = true;
+            }
+        }
+        
+        // Close the contour
+        if(pending)
+        {
+            d = min(d, spline2(last, control, first, x));
+            n += intersector(last, control, first, x);
+        }
+        else
+        {
+            d = min(d, lineseg(x, last, first));
+            n += intersector(last, first, x);
+        }
+    }
+    
+    return mix(d, -d, mod(n, 2.));
+}
+
+// Compute distance to glyph from its record at off in the font texture.
+// This function parses glyph point and control data and computes the correct
+// Spline control points. Then it uses the signed distance function to
+// piecewise bezier splines to get a signed distance to the font glyph.
+// Bits 4 to 7 of the texture header select the glyph record format; format 1
+// holds explicit segments and is handled by dsegments, format 2 refers to a
+// precomputed distance field and is handled by dsdf (with FONT_SDF defined
+// only), format 3 is bit packed and handled by dpacked, format 4 refers to
+// shared contours and is handled by dpooled. With bit 8 set, the record
+// starts with the size of the glyph bounding box, and points further than
+// bboxmargin from the box get the box distance without evaluating any
+// spline; it never exceeds the distance to the glyph. header is the header
+// of the font the record belongs to.
+float drecord(vec2 x, float header, float off)
+{
+    float format = header >= 32768. ? mod(floor(header/16.), 16.) : 0.;
+    
+    if(header >= 32768. && mod(floor(header/256.), 2.) == 1.)
+    {
+        // Bit packed records fold the sign into the offset
+        vec2 lower = format == 3. 
+            ? vec2(rshort(off+2.), rshort(off+3.))-32768.
+            : mix(c.xx,c.zz,vec2(rshort(off+2.), rshort(off+4.)))*vec2(rshort(off+3.), rshort(off+5.)),
+            upper = (lower + vec2(rshort(off), rshort(off+1.)))/65536.*size;
+        lower *= size/65536.;
+        float db = length(max(max(lower-x, x-upper), 0.));
+        if(db > bboxmargin) return db;
+        off += 2.;
+    }
+    
+    if(format == 1.)
+        return dsegments(x, off);
+#ifdef FONT_SDF
+    if(format == 2.)
+        return dsdf(x, off);
+#endif
+    if(format == 3.)
+        return dpacked(x, off);
+    if(format == 4.)
+        return dpooled(x, off);
     
     // Get short range offsets. Sign is read separately.
     vec2 dx = mix(c.xx,c.zz,vec2(rshort(off), rshort(off+2.)))*vec2(rshort(off+1.), rshort(off+3.));
@@ -284,6 +622,81 @@ float dglyph(vec2 x, int ascii)
     return mix(d, -d, mod(n, 2.));
 }
 
+// Compute distance to glyph from ascii value out of the font texture.
+// With bit 9 set, the texture holds several fonts. The header is followed by
+// the number of fonts and the offsets of their sections, each with a header
+// and index of its own; font selects the section.
+float dglyph(vec2 x, int font, int ascii)
+{
+    float start = 0.,
+        header = rshort(0.);
+    
+    // Find the section of the font in the font table
+    if(header >= 32768. && mod(floor(header/512.), 2.) == 1.)
+    {
+        if(float(font) >= rshort(1.)) return 1.;
+        start = rshort(2.+float(font));
+        header = rshort(start);
+    }
+    
+    // Find character in glyph index
+    float off = glyphoffset(start, header, ascii);
+    // Ignore characters that are not present in the glyph index.
+    if(off == -1.) return 1.;
+    
+    return drecord(x, header, off);
+}
+
+// Distance to the glyph of the first (or only) font of the texture
+float dglyph(vec2 x, int ascii)
+{
+    return dglyph(x, 0, ascii);
+}
+
+// Distance to the text laid out by tx210 --line in the instance table at
+// table, the font_instances_offset passed along with the texture. It holds
+// the number of lines, the line height and the ascent, then the offsets of
+// the line tables; every line table holds its number of instances and per
+// instance the glyph record offset and the pen position as high and low
+// short. The first baseline is at y = 0, the line of x follows from its
+// height and the instance from a binary search over the pen positions of
+// the line. Its neighbours are evaluated as well, since outlines may reach
+// past the next pen position.
+float dtext(vec2 x, float table)
+{
+    float header = rshort(0.);
+    
+    // Instances refer to the first font of the font table
+    if(header >= 32768. && mod(floor(header/512.), 2.) == 1.)
+        header = rshort(rshort(2.));
+    
+    float unit = size/65536.,
+        nlines = rshort(table),
+        lineheight = rshort(table+1.)*unit;
+    if(nlines == 0.) return 1.;
+    float line = clamp(floor((rshort(table+2.)*unit-x.y)/lineheight), 0., nlines-1.),
+        loff = rshort(table+3.+line),
+        n = rshort(loff),
+        lo = 0., hi = n;
+    x.y += line*lineheight;
+    
+    // Last instance with its pen position left of x, or the first one
+    for(int i=0; i<16 && hi-lo > 1.; ++i)
+    {
+        float k = floor(.5*(lo+hi));
+        if((rshort(loff+2.+3.*k)+rshort(loff+3.+3.*k)/65536.)*size <= x.x) lo = k;
+        else hi = k;
+    }
+    
+    float d = 1.;
+    for(float k=max(lo-1., 0.); k<=min(lo+1., n-1.); k+=1.)
+    {
+        float pen = (rshort(loff+2.+3.*k)+rshort(loff+3.+3.*k)/65536.)*size;
+        d = min(d, drecord(x-vec2(pen, 0.), header, rshort(loff+1.+3.*k)));
+    }
+    return d;
+}
+
 mat2 rot(float t)
 {
     vec2 sc = vec2(cos(t), sin(t));
@@ -303,6 +716,7 @@ void mainImage( out vec4 fragColor, in vec2 fragCoord )
     // Time varying pixel color
     vec3 col = 0.5 + 0.5*cos(iTime+uv.xyx+vec3(0,2,4));
     size = .54;
+    bboxmargin = 1.e-3+1.5/iResolution.y;
 //     col *= smoothstep(-1.5/iResolution.y,1.5/iResolution.y,dglyph(x, char)); //103
     col *= smoothstep(-1.5/iResolution.y,1.5/iResolution.y,stroke(dglyph(x, char), 1.e-3)); //103
     fragColor = vec4(col,1.0);
@@ -0,0 +1,39 @@
+import subprocess
+import sys
+import os
+import numpy as np
+import pytest
+import tx210
+import txrender
+
+fontfile = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Lines laid out against a font group need the glyphs of their characters,
+# even when the group text does not have them
+def test_group_lines(tmp_path):
+    outfile = str(tmp_path / 'lines.bin')
+    subprocess.run([ sys.executable, os.path.join(root, 'tx210.py'), '-q', '-g', fontfile, 'ab', '-L', 'Hello', '-L', 'xyz', '-o', outfile ], check=True, stdout=subprocess.DEVNULL)
+    header, texture, atlas = tx210.load_binary(outfile)
+    table = header['instances_offset']
+    assert table != 0 and texture[table] == 2
+    for i, line in enumerate([ 'Hello', 'xyz' ]):
+        o = texture[table+3+i]
+        assert texture[o] == len(line)
+        assert [ texture[o+1+3*k] for k in range(len(line)) ] == [ txrender.glyph_offset(texture, ord(char)) for char in line ]
+
+def test_instances_offset_range():
+    layout = [ [ ('a', 0), ('b', 1000) ] ]
+    assert len(tx210.pack_instances(layout, 100, 80, { 'a': 10, 'b': 20 }, 65535-11)) == 11
+    with pytest.raises(tx210.PackError):
+        tx210.pack_instances(layout, 100, 80, { 'a': 10, 'b': 20 }, 65535-10)
+
+# The one-point contour of DejaVu Sans 'u' draws a dot with the stack machine,
+# so the segments format has to keep its zero length line
+def test_segments_match_points():
+    x = np.stack(np.meshgrid(np.linspace(-.2, .6, 64), np.linspace(-.2, .8, 64)), axis=-1).reshape(-1, 2)
+    distances = []
+    for format in [ 'points', 'segments' ]:
+        texture, meta = tx210.build_texture(fontfile, [ 'u' ], format=format)
+        distances += [ txrender.glyph_distance(x, txrender.decode_glyph(texture, ord('u')), 5.4) ]
+    assert np.array_equal(distances[0], distances[1])
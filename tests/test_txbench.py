@@ -0,0 +1,25 @@
+import pytest
+import tx210
+import txbench
+import txrender
+
+fontfile = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+
+# Texture that counts single short reads, like texture fetches of the shader
+class CountingTexture:
+    def __init__(self, texture):
+        self.texture = texture
+        self.fetches = 0
+
+    def __getitem__(self, i):
+        assert not isinstance(i, slice)
+        self.fetches += 1
+        return self.texture[i]
+
+@pytest.mark.parametrize('index', tx210.index_types)
+def test_index_fetches(index):
+    texture, meta = tx210.build_texture(fontfile, None, index)
+    for i in [ 0, len(meta['text'])-1 ]:
+        counting = CountingTexture(texture)
+        assert txrender.glyph_offset(counting, ord(meta['text'][i])) == meta['offsets'][i]
+        assert txbench.index_fetches(texture, i) == counting.fetches
@@ -0,0 +1,25 @@
+import numpy as np
+import os
+import tx210
+import txcache
+
+fontfile = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+
+def test_corrupt_entries_are_misses(tmp_path):
+    cache = txcache.GlyphCache(str(tmp_path), txcache.file_hash(fontfile), tx210.loadscale)
+    reference, meta = tx210.build_texture(fontfile, 'abcdef', cache=cache)
+    good = open(cache.filename('a'), 'rb').read()
+    # A byte of the point data, which the zip checksum covers
+    i = good.index(b'\x93NUMPY', good.index(b'x.npy'))+136
+    corrupt = { 'a': good[:len(good)//2], 'b': b'', 'c': b'no zip file'*8, 'd': good[:i]+bytes([ good[i] ^ 0xff ])+good[i+1:] }
+    for char, data in corrupt.items():
+        with open(cache.filename(char), 'wb') as f:
+            f.write(data)
+
+    cache = txcache.GlyphCache(str(tmp_path), txcache.file_hash(fontfile), tx210.loadscale)
+    texture, meta = tx210.build_texture(fontfile, 'abcdef', cache=cache)
+    assert np.array_equal(texture, reference)
+    assert (cache.hits, cache.misses) == (2, 4)
+    # The bad entries were removed and written again
+    for char in corrupt:
+        assert cache.get(char) is not None
@@ -0,0 +1,22 @@
+import pytest
+import txserve
+
+fontfile = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+
+@pytest.mark.parametrize('field, value', [ ('lines', 5), ('index', 3), ('text', [ 'a' ]), ('bbox', 1), ('sdf_pad', -1) ])
+def test_malformed_fields(field, value):
+    reply = txserve.handle(txserve.Fonts(), { 'font': fontfile, field: value })
+    assert not reply['ok'] and reply['error'].startswith("Request field " + field)
+
+# Errors that are not build errors name their type and are logged
+def test_unexpected_error(capsys):
+    class Broken(txserve.Fonts):
+        def get(self, fontfile, cubictolerance):
+            return {}['face']
+    reply = txserve.handle(Broken(), { 'font': fontfile })
+    assert reply == { 'ok': False, 'error': "KeyError: 'face'" }
+    assert 'Traceback' in capsys.readouterr().err
+
+def test_build():
+    reply = txserve.handle(txserve.Fonts(), { 'font': fontfile, 'text': 'ab', 'lines': [ 'ab' ] })
+    assert reply['ok'] and reply['glyphs'] == 2 and 'instances_offset' in reply
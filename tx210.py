@@ -15,216 +15,1305 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import argparse
+import contextlib
 import freetype
+import json
+import multiprocessing
 import numpy as np
-import struct
+import os
 import sys
-import random
+import tempfile
+import time
+import txcache
+import txsdf
 
-# CMD arg parser
-parser = argparse.ArgumentParser(description='Memory Texture Text Generation Tool by Team210.')
-parser.add_argument('-f', '--fontfile', dest='fontfile')
-parser.add_argument('-o', '--output', dest='outfile')
-args, rest = parser.parse_known_args()
+# Scale font to fit into unsigned short range
+loadscale = int(.1*65535.)
+
+# Specify format
+fmt = np.dtype('<u2') # little endian unsigned short
 
-# Notify and quit
+# Notify and quit; for the command line only
 def close(str):
     print(str)
-    exit()
-
-# Check args for consistency
-text = ""
-if rest != []:
-    text = list(set(rest[0]))
-    print("Unique character list is:", text)
-else:
-    text = [ chr(i) for i in range(32,127) ]
-    print("No text specified. Taking standard character list:", text)
-write_file = True
-if args.fontfile == None:
-    close("No font file specified. Doing nothing.")
-if args.outfile == None:
-    print("No output file selected. Writing to stdout instead.")
-    write_file = False  
-
-# Open font file
-font = freetype.Face(args.fontfile)
+    sys.exit()
 
-# Scale font to fit into unsigned short range
-loadscale = int(.1*65535.)
-font.set_char_size(loadscale)
+# Error of a texture that can not be built or read. Library functions raise
+# it, so callers like the build service can report the message and carry on;
+# the command line prints it and exits with a nonzero status.
+class PackError(ValueError):
+    pass
 
-# Specify format
-endian = '<' # little endian
-datatype = 'H' # unsigned short
-fmt = endian + datatype
-
-# Arrays for the data
-x_all = [] # all glyph x values
-y_all = [] # all glyph y values
-tags_all = [] # all glyph control data
-contours_all = [] # all glyph contour specifications
-deltax_all = [] # Short range offset to actual glyph data 
-deltay_all = [] # Short range offset to actual glyph data
-offsets = [] # Keep track of the glyph block length for building the index
-offset = 1+2*len(text) # Offset in texture
-
-text = sorted(text)
-
-# Get glyph outlines and move them above the zero threshold to fit into unsigned short range
-for char in text:
-    print("Processing char: " + char)
+# Wall times of the build stages in seconds, summed over the process. Stages
+# nest; time spent in an inner stage only counts for the inner one. Glyphs
+# extracted by worker processes only count for extraction as a whole.
+stage_times = {}
+stage_stack = []
 
+@contextlib.contextmanager
+def stage(name):
+    start = time.perf_counter()
+    stage_stack.append(0.)
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter()-start
+        inner = stage_stack.pop()
+        stage_times[name] = stage_times.get(name, 0.) + elapsed-inner
+        if stage_stack != []:
+            stage_stack[-1] += elapsed
+
+# Rotate every contour until it starts with an on-curve point. The number of
+# single-step rotations needed is the distance from the last on-curve point of
+# a contour to its end, so all contours are permuted at once. Contours without
+# any on-curve point are left untouched.
+def rotate_contours(x, y, tags, contours):
+    if len(contours) == 0:
+        return np.zeros(0, dtype=int)
+    iend = np.asarray(contours, dtype=int)
+    istart = np.concatenate(([0], iend[:-1]+1))
+    n = iend-istart+1
+    index = np.arange(len(tags))
+    last_on = np.maximum.reduceat(np.where(tags == 1, index, -1)[:iend[-1]+1], istart)
+    rotations = np.where((tags[istart] != 1) & (last_on >= istart), iend+1-last_on, 0)
+    if rotations.any():
+        start_rep = np.repeat(istart, n)
+        perm = index.copy()
+        perm[:iend[-1]+1] = start_rep + (index[:iend[-1]+1]-start_rep-np.repeat(rotations, n)) % np.repeat(n, n)
+        x[:] = x[perm]
+        y[:] = y[perm]
+        tags[:] = tags[perm]
+    return rotations
+
+# Largest distance of the quadratic splines that replace a cubic spline from
+# the cubic, in glyph units
+cubic_tolerance = 2.
+
+# Replace the cubic splines of an outline with quadratic splines. FreeType
+# marks on-curve points with bit 0 of their tag and cubic control points with
+# bit 1. Every cubic is split into the smallest number n of pieces of equal
+# parameter range whose quadratic approximations stay within tolerance; the
+# quadratic of a piece gets the control point (3*(c1+c2)-(p0+p3))/4 of its
+# cubic control points, which is off by at most
+# sqrt(3)/36*|p3-3*c2+3*c1-p0|/n^3. Returns the points, the normalized tags
+# (1 on-curve, 0 quadratic control), the contour end indices and the number
+# of cubics that were replaced. Outlines without cubics keep the tags of
+# earlier versions, where every nonzero tag is on-curve.
+def convert_cubics(points, tags, contours, tolerance=cubic_tolerance):
+    if not np.any(tags & 3 == 2):
+        return points, (tags != 0).astype(int), contours, 0
+    tags = tags & 3
+    newpoints, newtags, newcontours = [], [], []
+    ncubics = 0
+    istart = 0
+    for iend in contours:
+        pts = points[istart:iend+1]
+        t = tags[istart:iend+1]
+        istart = iend+1
+        # Walk the contour from its first on-curve point
+        on = np.nonzero(t == 1)[0]
+        if len(on) != 0:
+            pts = np.roll(pts, -on[0], axis=0)
+            t = np.roll(t, -on[0])
+        i = 0
+        while i < len(pts):
+            if t[i] == 2 and 0 < i < len(pts)-1 and t[i+1] == 2:
+                p0, c1, c2, p3 = pts[i-1], pts[i], pts[i+1], pts[(i+2) % len(pts)]
+                error = np.sqrt(3.)/36.*np.linalg.norm(p3-3.*c2+3.*c1-p0)
+                n = max(1, int(np.ceil((error/tolerance)**(1./3.))))
+                # Points and derivatives of the cubic at the piece boundaries
+                u = np.linspace(0., 1., n+1)[:,None]
+                b = (1.-u)**3*p0 + 3.*(1.-u)**2*u*c1 + 3.*(1.-u)*u*u*c2 + u**3*p3
+                db = 3.*((1.-u)**2*(c1-p0) + 2.*(1.-u)*u*(c2-c1) + u*u*(p3-c2))/n
+                q1 = b[:-1]+db[:-1]/3.
+                q2 = b[1:]-db[1:]/3.
+                controls = (3.*(q1+q2)-(b[:-1]+b[1:]))/4.
+                # The end of the last piece is the next point of the contour
+                newpoints += [ p for k in range(n) for p in (controls[k], b[k+1]) ][:-1]
+                newtags += ([ 0, 1 ]*n)[:-1]
+                ncubics += 1
+                i += 2
+            else:
+                newpoints += [ pts[i] ]
+                newtags += [ t[i] & 1 ]
+                i += 1
+        newcontours += [ len(newpoints)-1 ]
+    return np.array(newpoints, dtype=float).reshape(-1, 2), np.array(newtags, dtype=int), np.array(newcontours, dtype=int), ncubics
+
+# Load glyph outline and move it above the zero threshold to fit into unsigned short range.
+# Cubic splines are replaced with quadratic splines within tolerance.
+# Returns the glyph record with the short range offsets dx and dy, the point
+# coordinates x and y, the normalized tags, the contour end indices, the
+# number of rotations applied to each contour and the number of cubics that
+# were replaced.
+def extract_glyph(font, char, tolerance=cubic_tolerance):
     # Load glyph outline
     font.load_char(char)
-    glyph = font.glyph
-    outline = glyph.outline
+    outline = font.glyph.outline
     
-    # Get outline points
-    points = np.array(outline.points, dtype=[('x',float), ('y',float)]) 
-    x = [int(np.floor(xi)) for xi in list(points['x']) ]
-    y = [int(np.floor(xi)) for xi in list(points['y']) ]
+    # Get outline points, tags and contours
+    points = np.array(outline.points, dtype=float).reshape(-1, 2)
+    points, tags, contours, cubics = convert_cubics(points, np.array(outline.tags, dtype=int), np.array(outline.contours, dtype=int), tolerance)
+    x = np.floor(points[:,0]).astype(int)
+    y = np.floor(points[:,1]).astype(int)
     
     # Determination how far glyph is out of bounds
-    xlower = 65535.
-    xupper = -65535.
-    ylower = 65535.
-    yupper = -65535.
-    
-    if x != []:
-        xlower = min(xlower, min(x))
-        xupper = max(xupper, max(x))
-        print("xlower",xlower,"xupper",xupper)
-    else:
-        xlower = 0
-        xupper = 0
-    if y != []:
-        ylower = min(ylower, min(y))
-        yupper = max(yupper, max(y))
-        print("ylower",ylower,"yupper",yupper)
-    else:
-        ylower = 0
-        yupper = 0
-    
-    # Save the offsets.
-    deltax_all +=  [ int(xlower) ] 
-    deltay_all +=  [ int(ylower) ] 
+    xlower = 0
+    ylower = 0
+    if len(x) != 0:
+        xlower = int(x.min())
+        ylower = int(y.min())
     
     # Modify the value ranges.
-    # + random.randint(1,101)
-    x = [ xi - xlower for xi in x ]
-    y = [ yi - ylower for yi in y ]
-    
-    # Get remaining data (tags, contours)
-    tags = outline.tags
-    for i in range(len(tags)):
-        if tags[i] != 0:
-            tags[i] = 1
+    x -= xlower
+    y -= ylower
     
     # Fix the tag sequence; we do not want it to start with off-curve points.
-    if outline.contours != []:
-        for i in range(len(outline.contours)):
-            istart = 0
-            iend = outline.contours[i]
-            if i>0:
-                istart = outline.contours[i-1] + 1;
-            
-            while tags[istart] != 1:
-                buf = tags[iend]
-                xbuf = x[iend]
-                ybuf = y[iend]
-                for j in range(iend,istart,-1):
-                    tags[j] = tags[j-1]
-                    x[j] = x[j-1]
-                    y[j] = y[j-1]
-                tags[istart] = buf
-                x[istart] = xbuf
-                y[istart] = ybuf
-                print('rotating.')
-        
-    tags_all += [ tags ]
-    contours_all += [ outline.contours ]
-    x_all += [ x ]
-    y_all += [ y ]
+    with stage('rotation'):
+        rotations = rotate_contours(x, y, tags, contours)
     
-    
-    # fill in the section lengths
-    # that is number of x values, number of y values, number of tags, number of contours,
-    # offset onto (x,y) for short range
-    offsets += [offset]
-    offset += (8 + len(x) + len(y) + len(outline.tags) + len(outline.contours))
-    #print(outline.contours, len(outline.contours), len(x)) 
-    print(outline.tags)
+    return { 'dx': xlower, 'dy': ylower, 'x': x, 'y': y, 'tags': tags, 'contours': contours, 'rotations': rotations, 'cubics': cubics }
+
+# Open font file. An open freetype.Face is used as it is, after setting its
+# char size to size (loadscale by default).
+def open_font(font, size=None):
+    with stage('face'):
+        if not isinstance(font, freetype.Face):
+            font = freetype.Face(font)
+        font.set_char_size(size if size != None else loadscale)
+    return font
+
+# Each worker process opens its own font faces, once per font file and size.
+worker_fonts = {}
+def extract_worker(task):
+    fontfile, size, tolerance, char = task
+    if (fontfile, size) not in worker_fonts:
+        worker_fonts[(fontfile, size)] = open_font(fontfile, size)
+    return extract_glyph(worker_fonts[(fontfile, size)], char, tolerance)
+
+# Get the glyph records for groups of (font, sorted text, size), where font is
+# a font file name or an open freetype.Face and size the char size (loadscale
+# for None). Cubic splines are replaced within cubictolerance
+# (cubic_tolerance for None). Records are taken from the group's entry of caches where
+# possible; the remaining glyphs of all groups are extracted serially or
+# fanned out together to jobs worker processes, so the groups are processed
+# concurrently. Worker processes open the font files themselves, so glyphs
+# of an open Face are always extracted serially. Returns the records of
+# every group in the order of its text.
+def collect_groups(groups, caches=None, jobs=1, cubictolerance=None):
+    if caches == None:
+        caches = [ None ] * len(groups)
+    if cubictolerance == None:
+        cubictolerance = cubic_tolerance
+    sizes = [ size if size != None else loadscale for font, text, size in groups ]
+    records = [ [ cache.get(char) if cache != None else None for char in text ] for (font, text, size), cache in zip(groups, caches) ]
+    missing = [ (g, i) for g in range(len(groups)) for i in range(len(records[g])) if records[g][i] is None ]
+    if missing == []:
+        return records
+    files = [ (g, i) for g, i in missing if not isinstance(groups[g][0], freetype.Face) ]
+    extracted = {}
+    if jobs > 1 and len(files) > 1:
+        with multiprocessing.Pool(min(jobs, len(files))) as pool:
+            tasks = [ (groups[g][0], sizes[g], cubictolerance, groups[g][1][i]) for g, i in files ]
+            extracted = dict(zip(files, pool.map(extract_worker, tasks, chunksize=max(1, len(tasks)//(4*jobs)))))
+    fonts = {}
+    for g, i in missing:
+        if (g, i) not in extracted:
+            if g not in fonts:
+                fonts[g] = open_font(groups[g][0], sizes[g])
+            extracted[(g, i)] = extract_glyph(fonts[g], groups[g][1][i], cubictolerance)
+        records[g][i] = extracted[(g, i)]
+        if caches[g] != None:
+            caches[g].put(groups[g][1][i], records[g][i])
+    return records
+
+# Get the glyph records for all characters of the sorted text from font, a
+# font file name or an open freetype.Face, like collect_groups does for a
+# single group.
+def collect_glyphs(font, text, cache=None, jobs=1, size=None, cubictolerance=None):
+    return collect_groups([ (font, text, size) ], [ cache ], jobs, cubictolerance)[0]
+
+# Textures either start with the number of glyphs in a linear glyph index
+# (without header) or with a header short, which has header_flag set and
+# stores the type of the glyph index that follows in its low four bits.
+header_flag = 0x8000
+index_types = [ 'linear', 'direct', 'paged' ]
+
+# Build the glyph index for the code points codes with glyph data at offsets
+# (in number of shorts). base is the position of the index in the texture.
+# Entries for code points without glyph are zero.
+#     linear: number of glyphs n, then n pairs of code point and offset
+#     direct: first code point, number of entries m, then m offsets
+#     paged: page shift s, first page, number of pages p, then p offsets of
+#            the pages' leaf tables (zero for empty pages), then the leaf
+#            tables with 2^s offsets each
+def pack_index(codes, offsets, index, base=0, shift=6):
+    codes = np.asarray(codes, dtype=int)
+    if index == 'linear':
+        table = np.zeros(1+2*len(codes), dtype=int)
+        table[0] = len(codes)
+        table[1::2] = codes
+        table[2::2] = offsets
+    elif index == 'direct':
+        first = int(codes.min()) if len(codes) != 0 else 0
+        count = int(codes.max())-first+1 if len(codes) != 0 else 0
+        table = np.zeros(2+count, dtype=int)
+        table[:2] = [ first, count ]
+        table[2+codes-first] = offsets
+    elif index == 'paged':
+        pages = codes >> shift
+        used = np.unique(pages)
+        first = int(pages.min()) if len(codes) != 0 else 0
+        npages = int(pages.max())-first+1 if len(codes) != 0 else 0
+        table = np.zeros(3+npages+(len(used) << shift), dtype=int)
+        table[:3] = [ shift, first, npages ]
+        table[3+used-first] = base+3+npages+(np.arange(len(used)) << shift)
+        leaf = np.searchsorted(used, pages)
+        table[3+npages+(leaf << shift)+(codes & ((1 << shift)-1))] = offsets
+    else:
+        raise PackError("Unknown glyph index type: " + str(index))
+    return table
+
+# Find the smallest index for the code points codes. Returns index type and page shift.
+def choose_index(codes, candidates=index_types[1:]):
+    best = None
+    for index in candidates:
+        for shift in (range(3, 9) if index == 'paged' else [ 6 ]):
+            length = len(pack_index(codes, np.zeros(len(codes)), index, 0, shift))
+            if best == None or length < best[0]:
+                best = (length, index, shift)
+    return best[1], best[2]
 
-print("Finished collecting necessary data.")
+# Resolve the contours of record into explicit line and quadratic segments,
+# as the stack machine in dglyph does per pixel: consecutive off-curve points
+# get their implicit on-curve midpoint inserted and every contour is closed.
+# Coordinates are in units of half a point, so the midpoints stay integers.
+# Returns the lines as rows (x0,y0,x1,y1) and the quads as rows
+# (x0,y0,x1,y1,x2,y2).
+def resolve_segments(record):
+    xy = 2*np.stack([ record['x'], record['y'] ], axis=1)
+    tags = record['tags']
+    lines = [ np.zeros((0,4), dtype=int) ]
+    quads = [ np.zeros((0,6), dtype=int) ]
+    istart = 0
+    for iend in record['contours']:
+        pts = xy[istart:iend+1]
+        on = tags[istart:iend+1] == 1
+        istart = iend+1
+        # Contours without on-curve point start at the midpoint of their ends
+        if not on.any():
+            pts = np.concatenate(((pts[-1:]+pts[:1])//2, pts))
+            on = np.concatenate(([ True ], on))
+        # Close the contour and materialize the implicit on-curve points
+        pts = np.concatenate((pts, pts[:1]))
+        on = np.append(on, True)
+        both = np.nonzero(~on[:-1] & ~on[1:])[0]
+        pts = np.insert(pts, both+1, (pts[both]+pts[both+1])//2, axis=0)
+        on = np.insert(on, both+1, True)
+        # One point between on-curve points makes a quad, none makes a line
+        ion = np.nonzero(on)[0]
+        step = np.diff(ion)
+        il = ion[:-1][step == 1]
+        iq = ion[:-1][step == 2]
+        lines += [ np.concatenate((pts[il], pts[il+1]), axis=1) ]
+        quads += [ np.concatenate((pts[iq], pts[iq+1], pts[iq+2]), axis=1) ]
+    # Zero length lines are kept; like the stack machine, lineseg gives the
+    # distance to their point, so one-point contours still draw a dot
+    return { 'lines': np.concatenate(lines), 'quads': np.concatenate(quads) }
+
+# Distance of the points x to the polyline through points
+def polyline_distance(x, points):
+    if len(points) == 1:
+        return np.linalg.norm(x-points[0], axis=1)
+    return txsdf.lineseg(x, points[:-1], points[1:]).min(axis=1)
+
+# Points of the quadratic splines with rows (x0,y0,x1,y1,x2,y2) at n
+# parameters each
+def sample_quads(quads, n=17):
+    t = np.linspace(0., 1., n)[None,:,None]
+    p0, p1, p2 = quads[:,None,:2], quads[:,None,2:4], quads[:,None,4:]
+    return ((1.-t)**2*p0 + 2.*(1.-t)*t*p1 + t*t*p2).reshape(-1, 2)
+
+# Indices of the points of the polyline to keep so no removed point is further
+# than tolerance from the simplified polyline (Ramer-Douglas-Peucker)
+def simplify_polyline(points, tolerance):
+    keep = [ 0, len(points)-1 ]
+    stack = [ (0, len(points)-1) ]
+    while stack != []:
+        a, b = stack.pop()
+        if b-a < 2:
+            continue
+        d = polyline_distance(points[a+1:b].astype(float), points[[a, b]].astype(float))
+        i = int(np.argmax(d))
+        if d[i] > tolerance:
+            keep += [ a+1+i ]
+            stack += [ (a, a+1+i), (a+1+i, b) ]
+    return sorted(keep)
+
+# Fit one quadratic spline to the run of quads, from the start of the first to
+# the end of the last with the tangents of both ends. The control point is
+# rounded to the integer grid of the records (even half units). Returns the
+# quad or None if the tangents do not meet in front of both ends or the fit is
+# further than tolerance from the run.
+def fit_quads(quads, tolerance):
+    p0, p2 = quads[0,:2], quads[-1,4:]
+    t0, t2 = quads[0,2:4]-p0, p2-quads[-1,2:4]
+    det = t0[0]*t2[1]-t0[1]*t2[0]
+    if det == 0:
+        return None
+    s = ((p2-p0)[0]*t2[1]-(p2-p0)[1]*t2[0])/float(det)
+    u = (t0[0]*(p2-p0)[1]-t0[1]*(p2-p0)[0])/float(det)
+    if s <= 0. or u <= 0.:
+        return None
+    control = 2*np.round((p0+s*t0)/2.).astype(int)
+    fit = np.concatenate((p0, control, p2))
+    run = sample_quads(quads.astype(float))
+    curve = sample_quads(fit[None,:].astype(float), 65)
+    if max(polyline_distance(run, curve).max(), polyline_distance(curve, run).max()) > tolerance:
+        return None
+    return fit
+
+# Replace runs of consecutive quads with fewer quads where fit_quads allows.
+# Merged quads start and end on the integer grid, so their end points can be
+# stored as on-curve points.
+def simplify_quads(quads, tolerance):
+    result = []
+    i = 0
+    while i < len(quads):
+        best, end = quads[i], i
+        if np.all(quads[i,:2] % 2 == 0):
+            for j in range(i+1, len(quads)):
+                if np.any(quads[j,4:] % 2 != 0):
+                    continue
+                fit = fit_quads(quads[i:j+1], tolerance)
+                if fit is None:
+                    break
+                best, end = fit, j
+        result += [ best ]
+        i = end+1
+    return result
+
+# Simplify the outline of record: points between lines that are at most
+# tolerance (in glyph units) from the simplified outline are removed and runs
+# of quadratic splines are refit with fewer splines within tolerance. Returns
+# a copy of record with the new points, tags and contours, moved back above
+# zero. Contours keep their orientation and start.
+def simplify_glyph(record, tolerance):
+    tolerance = 2.*tolerance
+    xy = 2*np.stack([ record['x'], record['y'] ], axis=1)
+    tags = record['tags']
+    x, y, newtags, contours = [], [], [], []
+    istart = 0
+    for iend in record['contours']:
+        pts = xy[istart:iend+1]
+        on = tags[istart:iend+1] == 1
+        istart = iend+1
+        # Resolve the segments of the contour like resolve_segments
+        if not on.any():
+            pts = np.concatenate(((pts[-1:]+pts[:1])//2, pts))
+            on = np.concatenate(([ True ], on))
+        pts = np.concatenate((pts, pts[:1]))
+        on = np.append(on, True)
+        both = np.nonzero(~on[:-1] & ~on[1:])[0]
+        pts = np.insert(pts, both+1, (pts[both]+pts[both+1])//2, axis=0)
+        on = np.insert(on, both+1, True)
+        ion = np.nonzero(on)[0]
+        # Segments as (start, control or None, end), simplified run by run
+        segments = []
+        k = 0
+        while k < len(ion)-1:
+            quad = ion[k+1]-ion[k] == 2
+            m = k
+            while m < len(ion)-1 and (ion[m+1]-ion[m] == 2) == quad:
+                m += 1
+            if quad:
+                run = np.array([ np.concatenate((pts[a], pts[a+1], pts[a+2])) for a in ion[k:m] ])
+                segments += [ (q[:2], q[2:4], q[4:]) for q in simplify_quads(run, tolerance) ]
+            else:
+                run = pts[ion[k:m+1]]
+                keep = simplify_polyline(run, tolerance)
+                segments += [ (run[a], None, run[b]) for a, b in zip(keep[:-1], keep[1:]) ]
+            k = m
+        # Start points that are the midpoint of the controls around them stay
+        # implicit; the contour starts at the first explicit one
+        explicit = [ segments[i][1] is None or segments[i-1][1] is None or np.any(2*segments[i][0] != segments[i][1]+segments[i-1][1]) for i in range(len(segments)) ]
+        first = explicit.index(True) if any(explicit) else 0
+        points = []
+        for i in list(range(first, len(segments))) + list(range(first)):
+            start, control, end = segments[i]
+            if explicit[i]:
+                points += [ (start, 1) ]
+            if control is not None:
+                points += [ (control, 0) ]
+        x += [ p[0]//2 for p, tag in points ]
+        y += [ p[1]//2 for p, tag in points ]
+        newtags += [ tag for p, tag in points ]
+        contours += [ len(x)-1 ]
+    x = np.array(x, dtype=int)
+    y = np.array(y, dtype=int)
+    xlower = int(x.min()) if len(x) != 0 else 0
+    ylower = int(y.min()) if len(y) != 0 else 0
+    return dict(record, dx=record['dx']+xlower, dy=record['dy']+ylower, x=x-xlower, y=y-ylower, tags=np.array(newtags, dtype=int), contours=np.array(contours, dtype=int))
+
+# Number of lines and quadratic splines the outlines of records resolve to
+def segment_count(records):
+    segments = [ resolve_segments(record) for record in records ]
+    return sum(len(s['lines']) for s in segments), sum(len(s['quads']) for s in segments)
+
+# Zigzag coding maps signed to unsigned integers: 0, -1, 1, -2, ... to 0, 1, 2, 3, ...
+def zigzag(v):
+    return np.where(v < 0, -2*v-1, 2*v)
+
+def unzigzag(v):
+    return np.where(v % 2 == 1, -(v+1)//2, v//2)
+
+# Number of bits needed to store the unsigned integers v
+def bit_width(v):
+    return int(np.max(v)).bit_length() if len(v) != 0 else 0
+
+# Concatenate the lowest widths[i] bits of every values[i] into a bitstream of
+# shorts. Bits are stored least significant first.
+def pack_bits(values, widths):
+    values = np.asarray(values, dtype=int)
+    bit = np.arange(16)
+    bits = ((values[:,None] >> bit) & 1)[bit < np.asarray(widths, dtype=int)[:,None]]
+    bits = np.concatenate((bits, np.zeros(-len(bits) % 16, dtype=int)))
+    return np.packbits(bits.astype(np.uint8), bitorder='little').view('<u2')
+
+# Read count unsigned integers of width bits from the bitstream of shorts,
+# starting at bit position pos
+def unpack_bits(stream, pos, width, count):
+    bits = np.unpackbits(np.asarray(stream, dtype='<u2').view(np.uint8), bitorder='little')
+    return (bits[pos+np.arange(count)[:,None]*width+np.arange(width)].astype(int) << np.arange(width)).sum(axis=1)
+
+# Encode the points, tags and contours of record as bitstream: one bit per
+# tag, the zigzag coded differences of consecutive x and y values and the
+# number of points of each contour minus one. Returns the bit widths of the
+# x differences, y differences and contour lengths as one short (5 bits
+# each) and the bitstream.
+def encode_packed(record):
+    dxs = zigzag(np.diff(record['x'], prepend=0))
+    dys = zigzag(np.diff(record['y'], prepend=0))
+    lengths = np.diff(record['contours'], prepend=-1)-1
+    wx, wy, wc = bit_width(dxs), bit_width(dys), bit_width(lengths)
+    if max(wx, wy, wc) > 16:
+        raise PackError("Glyph differences do not fit into 16 bits.")
+    npts = len(dxs)
+    values = np.concatenate((record['tags'], dxs, dys, lengths))
+    widths = np.concatenate(([ 1 ]*npts, [ wx ]*npts, [ wy ]*npts, [ wc ]*len(lengths)))
+    return { 'widths': wx | (wy << 5) | (wc << 10), 'stream': pack_bits(values, widths) }
+
+# Reference decoder for packed glyph blocks at offset o of texture. Returns
+# the short range offsets, points, tags and contours like extract_glyph.
+def decode_packed(texture, o):
+    dx, dy, npts, ncont, widths = [ int(v) for v in texture[o:o+5] ]
+    wx, wy, wc = widths & 31, (widths >> 5) & 31, widths >> 10
+    stream = texture[o+5:]
+    tags = unpack_bits(stream, 0, 1, npts)
+    x = np.cumsum(unzigzag(unpack_bits(stream, npts, wx, npts)))
+    y = np.cumsum(unzigzag(unpack_bits(stream, npts*(1+wx), wy, npts)))
+    contours = np.cumsum(unpack_bits(stream, npts*(1+wx+wy), wc, ncont)+1)-1
+    return { 'dx': dx-32768, 'dy': dy-32768, 'x': x, 'y': y, 'tags': tags, 'contours': contours }
+
+# Split the contours of all records into a pool of unique contours. Contours
+# are normalized by moving their lower left corner to the origin, so equal
+# shapes at different positions (the dots of i and j, the base letters of
+# accented glyphs) are stored only once. Returns the pool as list of
+# (x, y, tags) tuples and for every record an array with one row of pool
+# index and translation (x, y) per contour.
+def pool_contours(records):
+    pool = []
+    keys = {}
+    refs = []
+    for record in records:
+        rows = np.zeros((len(record['contours']), 3), dtype=int)
+        istart = 0
+        for i, iend in enumerate(record['contours']):
+            x = record['x'][istart:iend+1]
+            y = record['y'][istart:iend+1]
+            tags = record['tags'][istart:iend+1]
+            istart = iend+1
+            tx = int(x.min())
+            ty = int(y.min())
+            contour = (x-tx, y-ty, tags)
+            key = np.stack(contour).astype(fmt).tobytes()
+            if key not in keys:
+                keys[key] = len(pool)
+                pool += [ contour ]
+            rows[i] = [ keys[key], tx, ty ]
+        refs += [ rows ]
+    return pool, refs
+
+# Number of shorts of a pooled contour: number of points, x values, y values and tags
+def contour_length(contour):
+    return 1 + 3*len(contour[0])
+
+# Glyph block formats, stored in bits 4 to 7 of the texture header
+#     points: short range offset, number of x values, x values, number of y
+#             values, y values, number of tags, tags, number of contours and
+#             contours
+#     segments: short range offset, number of lines, number of quads, then
+#               the lines and quads as resolved by resolve_segments
+#     sdf: short range offset of the distance field origin, grid spacing,
+#          padding in samples, position and size of the field in the atlas
+#          made by txsdf.build_atlas
+#     packed: short range offsets plus 32768, number of points, number of
+#             contours, bit widths and the bitstream of encode_packed
+#     pooled: short range offset, number of contours, then per contour the
+#             offset of its entry in the contour pool and its translation.
+#             The pool made by pool_contours follows the glyph blocks; every
+#             entry is the number of points, the x values, y values and tags.
+record_formats = [ 'points', 'segments', 'sdf', 'packed', 'pooled' ]
+
+# With bit 8 of the texture header set, every glyph block is prefixed with
+# the width and height of the glyph's bounding box (in points, relative to
+# the short range offset).
+bbox_flag = 0x100
+
+# With bit 9 of the texture header set, the texture holds several fonts: the
+# header is followed by the number of fonts n and the offsets of the n font
+# sections, each a texture of pack_texture with its own header, index and
+# glyph blocks. The texture header has no other bits set.
+fonts_flag = 0x200
+
+# Number of shorts in the glyph block of record
+def glyph_length(record, format, bbox=False):
+    if format == 'segments':
+        return 2*bbox + 6 + 4*len(record['lines']) + 6*len(record['quads'])
+    if format == 'sdf':
+        return 2*bbox + 10
+    if format == 'packed':
+        return 2*bbox + 5 + len(record['stream'])
+    if format == 'pooled':
+        return 2*bbox + 5 + 3*len(record['contours'])
+    return 2*bbox + 8 + 3*len(record['x']) + len(record['contours'])
+
+# Pack the glyph block of record into texture at offset o
+def pack_glyph(texture, o, record, format, bbox=False):
+    if bbox:
+        # Distance field records are positioned at the field origin, so
+        # their box covers the padding as well.
+        margin = 2*record['pad']*record['cell'] if format == 'sdf' else 0
+        if len(record['x']) != 0:
+            texture[o:o+2] = [ record['x'].max()+margin, record['y'].max()+margin ]
+        o += 2
+    dx = record['dx']
+    dy = record['dy']
+    if format == 'packed':
+        # The sign is folded into the offset
+        texture[o:o+5] = [ dx+32768, dy+32768, len(record['x']), len(record['contours']), record['widths'] ]
+        texture[o+5:o+5+len(record['stream'])] = record['stream']
+        return
+    if format == 'sdf':
+        dx -= record['pad']*record['cell']
+        dy -= record['pad']*record['cell']
+    # Pack short range offset. Need to pack sign separately!
+    texture[o:o+4] = [ int(dx<0), abs(dx), int(dy<0), abs(dy) ]
+    o += 4
+    if format == 'segments':
+        nlines = len(record['lines'])
+        nquads = len(record['quads'])
+        texture[o:o+2] = [ nlines, nquads ]
+        o += 2
+        texture[o:o+4*nlines] = record['lines'].ravel()
+        o += 4*nlines
+        texture[o:o+6*nquads] = record['quads'].ravel()
+        return
+    if format == 'sdf':
+        texture[o:o+6] = [ record['cell'], record['pad'], record['ax'], record['ay'], record['gw'], record['gh'] ]
+        return
+    if format == 'pooled':
+        texture[o] = len(record['refs'])
+        texture[o+1:o+1+record['refs'].size] = record['refs'].ravel()
+        return
+    npts = len(record['x'])
+    ncont = len(record['contours'])
+    # Pack number of x values and x values, same for y values and tags
+    for values in [ record['x'], record['y'], record['tags'] ]:
+        texture[o] = npts
+        texture[o+1:o+1+npts] = values
+        o += 1+npts
+    # Pack number of contours and contours
+    texture[o] = ncont
+    texture[o+1:o+1+ncont] = record['contours']
 
 # Assemble texture.
-# Length of glyph index
-texture = struct.pack(fmt, len(text))
-# Glyph index
-for i in range(len(text)):
-    # Pack ascii value of char
-    texture += struct.pack(fmt, ord(text[i]))
-    # Pack offset of glyph data in texture (in number of shorts)
-    texture += struct.pack(fmt, offsets[i])
-    print("Glyph '"+text[i]+"' with ordinal "+str(ord(text[i]))+" is at index ",offsets[i]," (byte ",2*offsets[i],", pixel ",offsets[i]/2.,").", "vals: ", int(deltax_all[i]<0), abs(deltax_all[i]), int(deltay_all[i]<0), abs(deltay_all[i]), len(x_all[i]))
-# Glyph data
-for i in range(len(text)):
-    # Pack short range offset
-    texture += struct.pack(fmt, int(deltax_all[i]<0)) # Need to pack sign separately!
-    texture += struct.pack(fmt, abs(deltax_all[i]))
-    texture += struct.pack(fmt, int(deltay_all[i]<0)) # Need to pack sign separately!
-    texture += struct.pack(fmt, abs(deltay_all[i]))
-    # Pack number of x values
-    texture += struct.pack(fmt, len(x_all[i]))
-    # Pack x values
-    for xi in x_all[i]:
-        texture += struct.pack(fmt, xi)
-    # Pack number of y values
-    texture += struct.pack(fmt, len(y_all[i]))
-    # Pack y values
-    for yi in y_all[i]:
-        texture += struct.pack(fmt, yi)
-    # Pack number of tags
-    texture += struct.pack(fmt, len(tags_all[i]))
-    # Pack tags
-    for ti in tags_all[i]:
-        texture += struct.pack(fmt, ti)
-    # Pack number of contours
-    texture += struct.pack(fmt, len(contours_all[i]))
-    # Pack contours
-    for ci in contours_all[i]:
-        texture += struct.pack(fmt, ci)
-
-print("Finished packing texture.")
-
-# Write output to c header file or stdout
-# Fill last 4-byte-block with zero
-length = int(len(texture)) # in bytes
-while ((length % 4) != 0):
-    texture += bytes(10)
-    length += 1
-print("Packed font is "+str(length)+" bytes.")
-
-# Get necessary texture size from data
-texs = str(int(np.ceil(np.sqrt(float(length)/4.))))
-print("Required texture size: " + texs)
-
-# Output header file
-array = []
-for i in range(int(np.ceil(length/2))):
-    array += [ struct.unpack(fmt, texture[2*i:2*i+2]) ][0] 
-text = "//Generated by tx210 (c) 2018 NR4/Team210\n\n#ifndef FONT_H\n#define FONT_H\n\n"
-text += "const unsigned short font_texture[{:d}]".format(int(np.ceil(length/2)))+" = {"
-for val in array[:-1]:
-    text += str(val) + ',' 
-text += str(array[-1]) + '};\n'
-text += "const int font_texture_size = " + str(texs) + ";"
-text += '\n#endif\n'
-
-if write_file:
-    with open(args.outfile, "wt") as f:
-        f.write(text)
-        f.close()
-else:
-    print(text)
+# The total length is known from the per-glyph counts, so the texture is
+# filled in place. It is padded with zeros to fill the last 4-byte-block.
+# The linear index with point records and without header is the original
+# format; all other index types ('direct', 'paged' or 'auto' for the smaller
+# of both), record formats and bounding boxes add a header. Records for the
+# sdf format need the atlas fields added by txsdf.build_atlas.
+# A texture packed with start != 0 is a font section that goes to position
+# start of a larger texture; it always has a header and all offsets in it,
+# including the returned ones, count from the start of the larger texture.
+# Returns the texture, the glyph offsets (in number of shorts) and the index
+# type that was used.
+def pack_texture(text, records, index='linear', format='points', bbox=False, start=0):
+    codes = [ ord(char) for char in text ]
+    if len(codes) != 0 and max(codes) > 65535:
+        raise PackError("Code points beyond the basic multilingual plane can not be indexed.")
+    shift = 6
+    if index == 'auto':
+        index, shift = choose_index(codes)
+    elif index == 'paged':
+        index, shift = choose_index(codes, [ 'paged' ])
+    header = index_types.index(index) | (record_formats.index(format) << 4) | (bbox_flag*bbox)
+    base = int(header != 0 or start != 0)
+    nindex = base + len(pack_index(codes, np.zeros(len(codes)), index, start+base, shift))
+    
+    if format == 'segments':
+        records = [ dict(record, **resolve_segments(record)) for record in records ]
+        if any(np.any(record[key] > 65535) for record in records for key in [ 'lines', 'quads' ]):
+            raise PackError("Glyph coordinates in half units do not fit into the unsigned short range.")
+    if format == 'packed':
+        if any(abs(record[key]) >= 32768 for record in records for key in [ 'dx', 'dy' ]):
+            raise PackError("Short range offsets do not fit into the packed format.")
+        records = [ dict(record, **encode_packed(record)) for record in records ]
+    lengths = [ glyph_length(record, format, bbox) for record in records ]
+    offsets = (start+np.cumsum([ nindex ] + lengths[:-1])).tolist()
+    nshorts = nindex + sum(lengths)
+    if format == 'pooled':
+        pool, refs = pool_contours(records)
+        poollengths = [ contour_length(contour) for contour in pool ]
+        pooloffsets = start+np.cumsum([ nshorts ] + poollengths[:-1])
+        if len(pool) != 0 and pooloffsets[-1] > 65535:
+            raise PackError("Contour pool does not fit into the unsigned short offset range.")
+        records = [ dict(record, refs=np.stack([ pooloffsets[rows[:,0]], rows[:,1], rows[:,2] ], axis=1) if len(rows) != 0 else rows) for record, rows in zip(records, refs) ]
+        nshorts += sum(poollengths)
+    nshorts += nshorts % 2
+    if len(text) != 0 and offsets[-1] > 65535:
+        raise PackError("Packed font does not fit into the unsigned short offset range.")
+    texture = np.zeros(nshorts, dtype=fmt)
+    if base != 0:
+        texture[0] = header_flag | header
+    # Glyph index: ascii value of char and offset of glyph data in texture (in number of shorts)
+    texture[base:nindex] = pack_index(codes, offsets, index, start+base, shift)
+    # Glyph data
+    for i in range(len(text)):
+        pack_glyph(texture, offsets[i]-start, records[i], format, bbox)
+    # Contour pool
+    if format == 'pooled':
+        for o, (x, y, tags) in zip(pooloffsets, pool):
+            texture[o-start] = len(x)
+            texture[o-start+1:o-start+1+3*len(x)] = np.concatenate((x, y, tags))
+    return texture, offsets, index
+
+# Side length of the square RGBA texture (4 bytes per texel) that holds texture
+def texture_size(texture):
+    return int(np.ceil(np.sqrt(float(texture.nbytes)/4.)))
+
+# Texture layouts: rgba8 puts two shorts into the bytes of every texel of a
+# square RGBA texture of side texture_size, which gfx.frag reads with
+# normalized float lookups. r16ui and rgba16ui hold one or four shorts per
+# texel of an unsigned integer texture, read exactly with texelFetch.
+texture_layouts = [ 'rgba8', 'r16ui', 'rgba16ui' ]
+layout_channels = { 'r16ui': 1, 'rgba16ui': 4 }
+
+# Width and height of an integer texture for n shorts with channels shorts
+# per texel: of the widths up to maxwidth, the one with the least padding,
+# and the most square of those
+def texture_shape(n, channels, maxwidth=4096):
+    texels = max(1, -(-n // channels))
+    widths = np.arange(min(-(-texels // maxwidth), maxwidth), min(texels, maxwidth)+1)
+    heights = -(-texels // widths)
+    best = np.lexsort((np.maximum(widths, heights), widths*heights-texels))[0]
+    return int(widths[best]), int(heights[best])
+
+# Lay texture out for an integer texture of layout. Returns the texture padded
+# to full rows and a copy of meta (as returned by build_texture) with the
+# 'texture_shape' width, height and shorts per texel added. rgba8 textures
+# are returned as they are.
+def layout_texture(texture, meta, layout='rgba8', maxwidth=4096):
+    if layout == 'rgba8':
+        return texture, meta
+    if layout not in layout_channels:
+        raise PackError("Unknown texture layout: " + str(layout))
+    channels = layout_channels[layout]
+    width, height = texture_shape(len(texture), channels, maxwidth)
+    if height > maxwidth:
+        raise PackError("Texture does not fit into {:d}x{:d} texels.".format(maxwidth, maxwidth))
+    texture = np.concatenate((texture, np.zeros(width*height*channels-len(texture), dtype=texture.dtype)))
+    return texture, dict(meta, texture_shape=(width, height, channels))
+
+# Build the font texture for the characters of text (the printable ascii
+# characters by default) from font, a font file name or an open
+# freetype.Face. The remaining arguments are those of collect_glyphs,
+# txsdf.build_atlas and pack_texture; outlines are simplified with
+# simplify_glyph if tolerance is given. Returns the texture and a dict with
+# the sorted characters 'text', the glyph 'records', the glyph 'offsets', the
+# 'index' type, the texture side length 'texture_size', the distance field
+# 'atlas' (None for other formats) and, with tolerance, the line and spline
+# counts 'segments' before and after simplification.
+def build_texture(font, text=None, index='linear', format='points', bbox=False, cache=None, jobs=1, sdfsamples=64, sdfpad=4, tolerance=None, cubictolerance=None):
+    text = sorted(set(text)) if text != None else [ chr(i) for i in range(32,127) ]
+    with stage('extraction'):
+        records = collect_glyphs(font, text, cache, jobs, cubictolerance=cubictolerance)
+    segments = None
+    if tolerance != None:
+        with stage('simplification'):
+            simplified = [ simplify_glyph(record, tolerance) for record in records ]
+            segments = { 'before': segment_count(records), 'after': segment_count(simplified) }
+        records = simplified
+    atlas = None
+    if format == 'sdf':
+        with stage('atlas'):
+            records, atlas = txsdf.build_atlas([ dict(record, **resolve_segments(record)) for record in records ], sdfsamples, sdfpad)
+    with stage('packing'):
+        texture, offsets, index = pack_texture(text, records, index, format, bbox)
+    meta = { 'text': text, 'records': records, 'offsets': offsets, 'index': index, 'texture_size': texture_size(texture), 'atlas': atlas }
+    if segments != None:
+        meta['segments'] = segments
+    return texture, meta
+
+# Pack the groups of (sorted text, records) into one texture with a font
+# table; arguments are those of pack_texture for every group. Returns the
+# texture and for every group the start of its section, the glyph offsets and
+# the index type that was used.
+def pack_fonts(groups, index='linear', format='points', bbox=False):
+    table = np.zeros(2+len(groups), dtype=int)
+    table[:2] = [ header_flag | fonts_flag, len(groups) ]
+    start = len(table) + len(table) % 2
+    sections = [ np.zeros(start, dtype=fmt) ]
+    fonts = []
+    for i, (text, records) in enumerate(groups):
+        if start > 65535:
+            raise PackError("Font sections do not fit into the unsigned short offset range.")
+        table[2+i] = start
+        texture, offsets, used = pack_texture(text, records, index, format, bbox, start)
+        sections += [ texture ]
+        fonts += [ (start, offsets[:len(text)], used) ]
+        start += len(texture)
+    sections[0][:len(table)] = table
+    return np.concatenate(sections), fonts
+
+# Build one texture with a font table for the groups of (font, text, size)
+# of collect_groups, where a text of None stands for the printable ascii
+# characters. The remaining arguments are those of build_texture, with one
+# cache per group in caches. The distance fields of all groups share one
+# atlas. Returns the texture and a dict like build_texture, where 'text',
+# 'records' and 'offsets' run over all groups one after the other, 'index'
+# holds the index type of every group and 'fonts' has a dict with the 'base'
+# of the section and the 'text', 'records', 'offsets' and 'index' of every
+# group.
+def build_fonts(groups, index='linear', format='points', bbox=False, caches=None, jobs=1, sdfsamples=64, sdfpad=4, tolerance=None, cubictolerance=None):
+    groups = [ (font, sorted(set(text)) if text != None else [ chr(i) for i in range(32,127) ], size) for font, text, size in groups ]
+    with stage('extraction'):
+        records = collect_groups(groups, caches, jobs, cubictolerance)
+    segments = None
+    if tolerance != None:
+        with stage('simplification'):
+            simplified = [ [ simplify_glyph(record, tolerance) for record in group ] for group in records ]
+            segments = { 'before': segment_count(sum(records, [])), 'after': segment_count(sum(simplified, [])) }
+        records = simplified
+    atlas = None
+    if format == 'sdf':
+        with stage('atlas'):
+            flat, atlas = txsdf.build_atlas([ dict(record, **resolve_segments(record)) for group in records for record in group ], sdfsamples, sdfpad)
+        ends = np.cumsum([ len(group) for group in records ]).tolist()
+        records = [ flat[end-len(group):end] for group, end in zip(records, ends) ]
+    with stage('packing'):
+        texture, packed = pack_fonts([ (text, group) for (font, text, size), group in zip(groups, records) ], index, format, bbox)
+    fonts = [ { 'base': base, 'text': text, 'records': group, 'offsets': offsets, 'index': used } for (font, text, size), group, (base, offsets, used) in zip(groups, records, packed) ]
+    meta = { key: [ value for font in fonts for value in font[key] ] for key in [ 'text', 'records', 'offsets' ] }
+    meta.update({ 'index': [ font['index'] for font in fonts ], 'texture_size': texture_size(texture), 'atlas': atlas, 'fonts': fonts })
+    if segments != None:
+        meta['segments'] = segments
+    return texture, meta
+
+# Laid out text is stored in an instance table at the end of the texture,
+# at an offset that is passed to the shader along with the texture:
+#     number of lines m, line height, ascent, then the offsets of m line
+#     tables. Every line table holds its number of instances n and n
+#     instances of glyph block offset and pen position (high and low short).
+# Lengths are in glyph units. The first baseline is at y = 0, the following
+# ones are a line height further down each, and pen positions start at
+# x = 0. The instances of a line are sorted by pen position.
+
+# Lay out the lines of text with the advance widths and kerning pairs of
+# font, a font file name or an open freetype.Face, at char size size
+# (loadscale by default). Returns the (character, pen position) instances of
+# every line, the line height and the ascent.
+def layout_lines(font, lines, size=None):
+    font = open_font(font, size)
+    layout = []
+    for line in lines:
+        pen = 0
+        previous = None
+        instances = []
+        for char in line:
+            if previous != None and font.has_kerning:
+                pen += font.get_kerning(previous, char).x
+            font.load_char(char)
+            instances += [ (char, pen) ]
+            pen += font.glyph.advance.x
+            previous = char
+        layout += [ instances ]
+    return layout, font.size.height, font.size.ascender
+
+# Pack the instance table of layout (as returned by layout_lines) for position
+# start of the texture. offsets maps characters to the offsets of their glyph
+# blocks; other characters get no instance.
+def pack_instances(layout, lineheight, ascent, offsets, start):
+    lines = [ [ (offsets[char], pen) for char, pen in instances if char in offsets ] for instances in layout ]
+    if any(pen < 0 or pen >= 1 << 32 for line in lines for offset, pen in line):
+        raise PackError("Pen positions do not fit into the instance table.")
+    lengths = [ 1+3*len(line) for line in lines ]
+    if start+3+len(lines)+sum(lengths) > 65535 or lineheight > 65535 or ascent > 65535:
+        raise PackError("Instance table does not fit into the unsigned short offset range.")
+    table = np.zeros(3+len(lines)+sum(lengths), dtype=int)
+    table[:3] = [ len(lines), lineheight, ascent ]
+    o = 3+len(lines)
+    for i, line in enumerate(lines):
+        table[3+i] = start+o
+        table[o] = len(line)
+        for k, (offset, pen) in enumerate(line):
+            table[o+1+3*k:o+4+3*k] = [ offset, pen >> 16, pen & 0xffff ]
+        o += lengths[i]
+    return table
+
+# Lay out lines with the first font of meta (as returned by build_texture or
+# build_fonts) and append the instance table to texture. Glyphs without
+# outline get no instances. Returns the texture and a copy of meta with the
+# 'instances_offset' of the table and the 'layout' of layout_lines.
+def add_instances(texture, meta, font, lines, size=None):
+    group = meta.get('fonts', [ meta ])[0]
+    offsets = { char: offset for char, record, offset in zip(group['text'], group['records'], group['offsets']) if len(record['x']) != 0 }
+    with stage('layout'):
+        layout, lineheight, ascent = layout_lines(font, lines, size)
+        start = len(texture)
+        table = pack_instances(layout, lineheight, ascent, offsets, start)
+        texture = np.concatenate((texture, table.astype(fmt), np.zeros(len(table) % 2, dtype=fmt)))
+    return texture, dict(meta, instances_offset=start, layout=layout, texture_size=texture_size(texture))
+
+# Write the values of a C initializer in chunks so the full text is never
+# held in memory
+def write_values(f, values, chunksize=4096):
+    for i in range(0, len(values), chunksize):
+        if i != 0:
+            f.write(',')
+        f.write(','.join(map(str, values[i:i+chunksize].tolist())))
+
+# Write the C header. The distance field atlas of the sdf format is written
+# as font_sdf, a single channel texture of font_sdf_width x font_sdf_height.
+# Textures with an integer layout of shape (width, height, channels) come
+# with font_texture_width, font_texture_height and font_texture_channels
+# instead of font_texture_size. The offset of the instance table of
+# laid out text is written as font_instances_offset.
+def write_header(f, texture, texs, atlas=None, shape=None, instances=None):
+    f.write("//Generated by tx210 (c) 2018 NR4/Team210\n\n#ifndef FONT_H\n#define FONT_H\n\n")
+    f.write("const unsigned short font_texture[{:d}]".format(len(texture))+" = {")
+    write_values(f, texture)
+    f.write('};\n')
+    if shape != None:
+        f.write("const int font_texture_width = {:d}, font_texture_height = {:d}, font_texture_channels = {:d};".format(*shape))
+    else:
+        f.write("const int font_texture_size = " + str(texs) + ";")
+    if instances != None:
+        f.write("\nconst int font_instances_offset = {:d};".format(instances))
+    if atlas is not None:
+        f.write("\nconst unsigned char font_sdf[{:d}]".format(atlas.size)+" = {")
+        write_values(f, atlas.ravel())
+        f.write('};\n')
+        f.write("const int font_sdf_width = {:d}, font_sdf_height = {:d};".format(atlas.shape[1], atlas.shape[0]))
+    f.write('\n#endif\n')
+
+# Raw binary textures start with a header of binary_header_fields little
+# endian 32 bit values, followed by the texture shorts and the distance field
+# atlas bytes if there is one. Bump binary_version whenever this layout
+# changes. The header is 40 bytes, so the texture can be mapped directly.
+# Since version 2, layout is the index of the texture layout in
+# texture_layouts; texture_size is the width of integer layouts. Version 1
+# files, where the field was reserved and zero, are still read. Version 3
+# adds the offset of the instance table (zero without one) and a reserved
+# field; older files have the 32 byte header of the first eight fields.
+binary_magic = 0x31327874 # 'tx21'
+binary_version = 3
+binary_header_fields = [ 'magic', 'version', 'glyphs', 'texture_size', 'texture_length', 'sdf_width', 'sdf_height', 'layout', 'instances_offset', 'reserved' ]
+binary_header = np.dtype([ (name, '<u4') for name in binary_header_fields ])
+binary_header_v2 = np.dtype([ (name, '<u4') for name in binary_header_fields[:8] ])
+output_formats = [ 'c', 'bin', 'npy', 'asm', 'glsl' ]
+
+# Write the raw binary texture of nglyphs glyphs
+def write_binary(f, texture, texs, nglyphs, atlas=None, shape=None, instances=None):
+    header = np.zeros(1, dtype=binary_header)
+    header['magic'] = binary_magic
+    header['version'] = binary_version
+    header['glyphs'] = nglyphs
+    header['texture_size'] = texs
+    header['texture_length'] = len(texture)
+    if instances != None:
+        header['instances_offset'] = instances
+    if shape != None:
+        header['texture_size'] = shape[0]
+        header['layout'] = texture_layouts.index([ layout for layout, channels in layout_channels.items() if channels == shape[2] ][0])
+    if atlas is not None:
+        header['sdf_height'], header['sdf_width'] = atlas.shape
+    f.write(header.tobytes())
+    f.write(texture.astype(fmt).tobytes())
+    if atlas is not None:
+        f.write(atlas.tobytes())
+
+# Map a raw binary texture file. Returns the header as dict, the texture and
+# the atlas (None without distance field) as read only memory maps.
+def load_binary(filename):
+    header = np.fromfile(filename, dtype=binary_header_v2, count=1)
+    if len(header) == 0 or header['magic'][0] != binary_magic:
+        raise PackError("Not a tx210 binary texture: " + filename)
+    if header['version'][0] not in [ 1, 2, binary_version ]:
+        raise PackError("Unsupported tx210 binary texture version: " + str(header['version'][0]))
+    dtype = binary_header if header['version'][0] == binary_version else binary_header_v2
+    header = np.fromfile(filename, dtype=dtype, count=1)
+    header = { name: int(header[name][0]) if name in dtype.names else 0 for name in binary_header_fields }
+    texture = np.memmap(filename, dtype=fmt, mode='r', offset=dtype.itemsize, shape=(header['texture_length'],))
+    atlas = None
+    if header['sdf_width']*header['sdf_height'] != 0:
+        atlas = np.memmap(filename, dtype=np.uint8, mode='r', offset=dtype.itemsize+2*header['texture_length'], shape=(header['sdf_height'], header['sdf_width']))
+    return header, texture, atlas
+
+# With .npy output, the atlas of the sdf format goes to a second array next to
+# the texture with _sdf appended to the name.
+def sdf_npy_name(filename):
+    return (filename[:-4] if filename.endswith('.npy') else filename)+'_sdf.npy'
+
+# Write a GNU assembler stub that includes the texture and atlas from the raw
+# binary file binname with .incbin, under the names of the C header. The
+# file is looked up in the assembler's include path, which holds the current
+# directory.
+def write_asm(f, binname, texture, texs, atlas=None, shape=None, instances=None):
+    f.write("// Generated by tx210 (c) 2018 NR4/Team210\n\n")
+    f.write("    .section .rodata\n")
+    symbols = [ ('font_texture', binary_header.itemsize, texture.nbytes, 2) ]
+    if atlas is not None:
+        symbols += [ ('font_sdf', binary_header.itemsize+texture.nbytes, atlas.size, 1) ]
+    for name, offset, length, align in symbols:
+        f.write("    .global {0:s}\n    .type {0:s}, @object\n    .balign {3:d}\n{0:s}:\n    .incbin \"{1:s}\", {2:d}, {4:d}\n    .size {0:s}, {4:d}\n".format(name, binname, offset, align, length))
+    values = [ ('font_texture_size', int(texs)) ]
+    if shape != None:
+        values = list(zip([ 'font_texture_width', 'font_texture_height', 'font_texture_channels' ], shape))
+    if instances != None:
+        values += [ ('font_instances_offset', instances) ]
+    if atlas is not None:
+        values += [ ('font_sdf_width', atlas.shape[1]), ('font_sdf_height', atlas.shape[0]) ]
+    for name, value in values:
+        f.write("    .global {0:s}\n    .type {0:s}, @object\n    .balign 4\n{0:s}:\n    .long {1:d}\n    .size {0:s}, 4\n".format(name, value))
+    f.write("    .section .note.GNU-stack,\"\",@progbits\n")
+
+# Rough instruction counts of gfx.frag's distance and crossing functions for
+# one line (lineseg and intersector) and one quadratic spline (spline2 and
+# intersector), for the cost estimate of baked glyph functions
+glsl_line_cost = 26
+glsl_quad_cost = 120
+
+# Format v as GLSL float literal
+def glsl_float(v):
+    literal = '{:.7g}'.format(v)
+    return literal if '.' in literal or 'e' in literal else literal+'.'
+
+# Outlines of the glyphs of meta (as returned by build_texture or
+# build_fonts) in the coordinates of dglyph at size 1. Returns a list of
+# (font, character, lines, quads) with the lines as rows (x0,y0,x1,y1) and
+# the quads as rows (x0,y0,x1,y1,x2,y2).
+def glsl_glyphs(meta):
+    glyphs = []
+    for font, group in enumerate(meta.get('fonts', [ meta ])):
+        for char, record in zip(group['text'], group['records']):
+            segments = resolve_segments(record)
+            dx = [ record['dx'], record['dy'] ]
+            glyphs += [ (font, char, (.5*segments['lines']+np.tile(dx, 2))/65536., (.5*segments['quads']+np.tile(dx, 3))/65536.) ]
+    return glyphs
+
+# Estimated cost of the baked glyph functions of meta: the number of glyphs,
+# lines and quads and the mean and largest instruction count of a glyph
+def glsl_cost(meta):
+    glyphs = glsl_glyphs(meta)
+    costs = [ glsl_line_cost*len(lines) + glsl_quad_cost*len(quads) for font, char, lines, quads in glyphs ]
+    return { 'glyphs': len(glyphs), 'lines': sum(len(lines) for font, char, lines, quads in glyphs), 'quads': sum(len(quads) for font, char, lines, quads in glyphs),
+        'mean': float(np.mean(costs)) if costs != [] else 0., 'max': max(costs + [ 0 ]) }
+
+# Write GLSL source with a distance function of baked constants for every
+# glyph of meta and a dglyph that dispatches to them, to replace the texture
+# based dglyph of gfx.frag. The loops have constant bounds, so the compiler
+# can unroll them. Glyphs without segments get no function.
+def write_glsl(f, meta):
+    glyphs = glsl_glyphs(meta)
+    cost = glsl_cost(meta)
+    f.write("// Generated by tx210 (c) 2018 NR4/Team210\n")
+    f.write("// Baked outlines of {glyphs:d} glyphs: {lines:d} lines, {quads:d} splines, about {mean:.0f} instructions per glyph.\n".format(**cost))
+    f.write("// Needs size, lineseg, spline2 and intersector of gfx.frag.\n")
+    names = {}
+    for font, char, lines, quads in glyphs:
+        if len(lines)+len(quads) == 0:
+            continue
+        name = 'glyph{:d}_{:d}'.format(font, ord(char))
+        names[(font, char)] = name
+        f.write("\n// {:s}\n".format(repr(char)))
+        for suffix, segments, npoints in [ ('l', lines, 2), ('q', quads, 3) ]:
+            if len(segments) != 0:
+                points = segments.reshape(-1, 2)
+                f.write("const vec2 {0:s}{1:s}[{2:d}] = vec2[{2:d}](".format(name, suffix, len(points)))
+                f.write(','.join('vec2({:s},{:s})'.format(glsl_float(x), glsl_float(y)) for x, y in points))
+                f.write(");\n")
+        f.write("float d{:s}(vec2 x)\n{{\n    float d = 1., n = 0.;\n".format(name))
+        if len(lines) != 0:
+            f.write("    for(int i=0; i<{1:d}; ++i)\n    {{\n        vec2 p0 = {0:s}l[2*i]*size, p1 = {0:s}l[2*i+1]*size;\n".format(name, len(lines)))
+            f.write("        d = min(d, lineseg(x, p0, p1));\n        n += intersector(p0, p1, x);\n    }\n")
+        if len(quads) != 0:
+            f.write("    for(int i=0; i<{1:d}; ++i)\n    {{\n        vec2 p0 = {0:s}q[3*i]*size, p1 = {0:s}q[3*i+1]*size, p2 = {0:s}q[3*i+2]*size;\n".format(name, len(quads)))
+            f.write("        d = min(d, spline2(p0, p1, p2, x));\n        n += intersector(p0, p1, p2, x);\n    }\n")
+        f.write("    return mix(d, -d, mod(n, 2.));\n}\n")
+    f.write("\nfloat dglyph(vec2 x, int font, int ascii)\n{\n")
+    for (font, char), name in names.items():
+        f.write("    if(font == {:d} && ascii == {:d}) return d{:s}(x);\n".format(font, ord(char), name))
+    f.write("    return 1.;\n}\n\nfloat dglyph(vec2 x, int ascii)\n{\n    return dglyph(x, 0, ascii);\n}\n")
+
+# Output format for filename: given explicitly or taken from its extension
+def output_format(filename, format=None):
+    if format != None:
+        return format
+    extension = os.path.splitext(filename)[1].lower()
+    return { '.bin': 'bin', '.npy': 'npy', '.s': 'asm', '.asm': 'asm', '.glsl': 'glsl' }.get(extension, 'c')
+
+# Write the texture of meta (as returned by build_texture) to filename in
+# outformat, or in the format of its extension. Files are written to a
+# temporary file next to them first and then moved into place, so readers
+# never see partial output. The asm stub comes with a .bin file of the same
+# name. The glsl format holds the baked glyph functions of write_glsl instead
+# of the texture.
+def write_output(filename, texture, meta, outformat=None):
+    outformat = output_format(filename, outformat)
+    atlas = meta['atlas']
+    outputs = [ (filename, outformat) ]
+    if outformat == 'asm':
+        outputs = [ (os.path.splitext(filename)[0]+'.bin', 'bin') ] + outputs
+    if outformat == 'npy' and atlas is not None:
+        outputs += [ (sdf_npy_name(filename), 'sdf') ]
+    # Temporary files are private; give the output the usual permissions
+    umask = os.umask(0)
+    os.umask(umask)
+    for name, format in outputs:
+        fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(name)), suffix='.tmp')
+        try:
+            os.chmod(tmpname, 0o666 & ~umask)
+            with os.fdopen(fd, 'wt' if format in [ 'c', 'asm', 'glsl' ] else 'wb') as f:
+                if format == 'bin':
+                    write_binary(f, texture, meta['texture_size'], len(meta['text']), atlas, meta.get('texture_shape'), meta.get('instances_offset'))
+                elif format == 'npy':
+                    np.save(f, texture.astype(fmt))
+                elif format == 'sdf':
+                    np.save(f, atlas)
+                elif format == 'glsl':
+                    write_glsl(f, meta)
+                elif format == 'asm':
+                    write_asm(f, os.path.basename(outputs[0][0]), texture, meta['texture_size'], atlas, meta.get('texture_shape'), meta.get('instances_offset'))
+                else:
+                    write_header(f, texture, meta['texture_size'], atlas, meta.get('texture_shape'), meta.get('instances_offset'))
+            os.replace(tmpname, name)
+        except BaseException:
+            os.remove(tmpname)
+            raise
+
+def main():
+    # CMD arg parser
+    parser = argparse.ArgumentParser(description='Memory Texture Text Generation Tool by Team210.')
+    parser.add_argument('-f', '--fontfile', dest='fontfile')
+    parser.add_argument('-o', '--output', dest='outfile')
+    parser.add_argument('-c', '--cache', dest='cachedir', help='Directory for the persistent glyph cache.')
+    parser.add_argument('--cache-size', dest='cachesize', type=float, default=64., help='Glyph cache size limit in MiB.')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1, help='Number of worker processes for glyph extraction.')
+    parser.add_argument('-i', '--index', dest='index', default='linear', choices=index_types+['auto'], help='Glyph index layout.')
+    parser.add_argument('-r', '--records', dest='format', default='points', choices=record_formats, help='Glyph block format.')
+    parser.add_argument('--sdf-samples', dest='sdfsamples', type=int, default=64, help='Distance field samples across the largest glyph for the sdf format.')
+    parser.add_argument('--sdf-pad', dest='sdfpad', type=int, default=4, help='Distance field padding in samples for the sdf format.')
+    parser.add_argument('-e', '--tolerance', dest='tolerance', type=float, help='Simplify the outlines: merge nearly collinear lines and refit runs of splines with fewer splines within this error in glyph units.')
+    parser.add_argument('--cubic-tolerance', dest='cubictolerance', type=float, default=cubic_tolerance, help='Largest error in glyph units of the quadratic splines that replace the cubic splines of CFF fonts.')
+    parser.add_argument('-b', '--bbox', dest='bbox', action='store_true', help='Store glyph bounding boxes for early-out in the shader.')
+    parser.add_argument('-g', '--group', dest='groups', nargs='+', action='append', metavar='ARG', help='Font group FONTFILE [TEXT [SIZE]] of a texture with several fonts; can be given several times. TEXT defaults to the printable ascii characters, SIZE scales the load size (at most 1, 1 by default). The font file and text of --fontfile make the first group.')
+    parser.add_argument('-l', '--layout', dest='layout', default='rgba8', choices=texture_layouts, help='Texture layout: shorts packed into a square RGBA texture, or one or four shorts per texel of an unsigned integer texture for texelFetch.')
+    parser.add_argument('--max-width', dest='maxwidth', type=int, default=4096, help='Largest width and height of integer texture layouts in texels.')
+    parser.add_argument('-L', '--line', dest='lines', action='append', metavar='TEXT', help='Line of text to lay out with kerning into an instance table for dtext in gfx.frag; can be given several times. Its characters are packed as well.')
+    parser.add_argument('-t', '--output-format', dest='outformat', choices=output_formats, help='Output file format; taken from the output file extension by default (.bin, .npy, .s or .asm, .glsl, C header otherwise). The asm stub includes a .bin file of the same name, which is written as well. glsl writes baked glyph distance functions that need no texture.')
+    parser.add_argument('-q', '--quiet', dest='quiet', action='store_true', help='Only print errors, no per-glyph and summary output.')
+    parser.add_argument('--stats', dest='statsfile', metavar='FILE', help='Write build statistics as JSON: wall times of the build stages, per-glyph point, contour, segment and rotation counts, texture bytes and padding.')
+    args, rest = parser.parse_known_args()
+    start = time.perf_counter()
+    log = print if not args.quiet else lambda *values: None
+
+    # Check args for consistency
+    text = ""
+    if rest != []:
+        text = list(set(rest[0]+''.join(args.lines if args.lines != None else [])))
+        log("Unique character list is:", text)
+    elif args.lines != None:
+        text = list(set(''.join(args.lines)))
+        log("Unique character list of the lines is:", text)
+    else:
+        text = [ chr(i) for i in range(32,127) ]
+        log("No text specified. Taking standard character list:", text)
+    write_file = True
+    if args.fontfile == None and args.groups == None:
+        close("No font file specified. Doing nothing.")
+    if args.cubictolerance <= 0.:
+        close("The cubic tolerance has to be positive.")
+    if args.outfile == None:
+        log("No output file selected. Writing to stdout instead.")
+        write_file = False  
+
+    text = sorted(text)
+
+    groups = []
+    if args.fontfile != None:
+        groups += [ (args.fontfile, text, None) ]
+    for group in (args.groups if args.groups != None else []):
+        if len(group) > 3:
+            close("Font groups take a font file, a text and a size.")
+        size = None
+        if len(group) == 3:
+            try:
+                size = int(round(float(group[2])*loadscale))
+            except ValueError:
+                size = 0
+            if size <= 0 or size > loadscale:
+                close("Font group sizes must be positive numbers of at most 1.")
+        groups += [ (group[0], group[1] if len(group) > 1 else None, size) ]
+    if args.lines != None:
+        # The lines are laid out with the first group, so it needs their glyphs
+        font, text, size = groups[0]
+        groups[0] = (font, list(set(text if text != None else [ chr(i) for i in range(32,127) ]) | set(''.join(args.lines))), size)
+
+    caches = [ None ] * len(groups)
+    if args.cachedir != None:
+        caches = [ txcache.GlyphCache(args.cachedir, txcache.file_hash(font), size if size != None else loadscale, int(args.cachesize*1024*1024), args.cubictolerance) for font, text, size in groups ]
+
+    if args.groups == None:
+        texture, meta = build_texture(args.fontfile, text, args.index, args.format, args.bbox, caches[0], args.jobs, args.sdfsamples, args.sdfpad, args.tolerance, args.cubictolerance)
+        fonts = [ meta ]
+    else:
+        texture, meta = build_fonts(groups, args.index, args.format, args.bbox, caches, args.jobs, args.sdfsamples, args.sdfpad, args.tolerance, args.cubictolerance)
+        fonts = meta['fonts']
+    text = meta['text']
+    records = meta['records']
+    offsets = meta['offsets']
+    index = meta['index']
+    atlas = meta['atlas']
+    # Per-glyph output is the bulk of the log, skip it altogether when quiet
+    if not args.quiet:
+        for char, record in zip(text, records):
+            log("Processing char: " + char)
+            if len(record['x']) != 0:
+                log("xlower",record['dx'],"xupper",record['dx']+int(record['x'].max()))
+                log("ylower",record['dy'],"yupper",record['dy']+int(record['y'].max()))
+            for i in np.nonzero(record['rotations'])[0]:
+                log('rotating contour', i, 'by', record['rotations'][i])
+            if record['cubics'] != 0:
+                log('converted', record['cubics'], 'cubic splines')
+            log(record['tags'])
+            segments = resolve_segments(record)
+            log('segments', len(segments['lines']), 'lines', len(segments['quads']), 'splines')
+
+    if args.cachedir != None:
+        caches[0].evict()
+        for cache in caches:
+            log(cache.report())
+
+    log("Finished collecting necessary data.")
+
+    counts = [ len(segments['lines'])+len(segments['quads']) for segments in map(resolve_segments, records) ] if not args.quiet else []
+    if counts != []:
+        log("Outlines take {:.1f} segments per glyph on average, {:d} at most for {!r}.".format(np.mean(counts), max(counts), text[int(np.argmax(counts))]))
+    cubics = sum(record['cubics'] for record in records)
+    if cubics != 0:
+        log("Converted {:d} cubic splines into quadratic splines.".format(cubics))
+
+    if 'segments' in meta:
+        log("Simplification cut the outlines from {0[0]:d} lines and {0[1]:d} splines to {1[0]:d} lines and {1[1]:d} splines.".format(meta['segments']['before'], meta['segments']['after']))
+
+    if atlas is not None:
+        log("Distance field atlas is {:d}x{:d} bytes.".format(atlas.shape[1], atlas.shape[0]))
+
+    if args.groups == None:
+        log("Glyph index is " + index + ".")
+    else:
+        log("Texture holds {:d} fonts, glyph indices are {:s}.".format(len(fonts), ", ".join(index)))
+    if args.format == 'pooled' and not args.quiet:
+        npool = nused = saved = 0
+        for font in fonts:
+            pool, refs = pool_contours(font['records'])
+            used = np.bincount(np.concatenate([ rows[:,0] for rows in refs ]), minlength=len(pool)) if len(pool) != 0 else []
+            npool += len(pool)
+            nused += int(sum(used))
+            saved += sum((count-1)*contour_length(contour) for contour, count in zip(pool, used))
+        log("Contour pool holds {:d} of {:d} contours, deduplication saved {:d} bytes.".format(npool, nused, 2*saved))
+    if args.format != 'points':
+        length = sum(glyph_length(record, 'points', args.bbox) for record in records)
+        # Every section ends where the next one starts
+        ends = [ font['base'] for font in fonts[1:] ] + [ len(texture) ]
+        blocks = sum(end-font['offsets'][0] for font, end in zip(fonts, ends) if len(font['text']) != 0)
+        log("Glyph blocks take {:d} shorts, {:d} shorts in points format.".format(blocks, length))
+    if not args.quiet:
+        for i in range(len(text)):
+            dx = records[i]['dx']
+            dy = records[i]['dy']
+            log("Glyph '"+text[i]+"' with ordinal "+str(ord(text[i]))+" is at index ",offsets[i]," (byte ",2*offsets[i],", pixel ",offsets[i]/2.,").", "vals: ", int(dx<0), abs(dx), int(dy<0), abs(dy), len(records[i]['x']))
+
+    log("Finished packing texture.")
+
+    length = texture.nbytes # in bytes
+    log("Packed font is "+str(length)+" bytes.")
+
+    # Cost of baked glyph functions, to choose between texture and glsl output
+    if not args.quiet:
+        cost = glsl_cost(meta)
+        log("Baked glyph functions take {lines:d} lines and {quads:d} splines, about {mean:.0f} instructions per glyph and {max:d} at most.".format(**cost))
+
+    if args.lines != None:
+        texture, meta = add_instances(texture, meta, groups[0][0], args.lines, groups[0][2])
+        log("Instance table of {:d} lines is at index {:d}.".format(len(args.lines), meta['instances_offset']))
+
+    # Get necessary texture size from data
+    databytes = texture.nbytes
+    with stage('packing'):
+        texture, meta = layout_texture(texture, meta, args.layout, args.maxwidth)
+    texs = meta['texture_size']
+    if args.layout != 'rgba8':
+        log("Required texture size: {:d}x{:d} texels of {:d} shorts".format(*meta['texture_shape']))
+    else:
+        log("Required texture size: " + str(texs))
+
+    # Output header file to c header file or stdout
+    with stage('output'):
+        if write_file:
+            write_output(args.outfile, texture, meta, args.outformat)
+        else:
+            write_header(sys.stdout, texture, texs, atlas, meta.get('texture_shape'), meta.get('instances_offset'))
+            print()
+
+    if args.statsfile != None:
+        # Texture memory the GPU allocates: the square RGBA texture of rgba8
+        # or the full rows of integer layouts
+        allocated = 4*texs*texs if args.layout == 'rgba8' else 2*int(np.prod(meta['texture_shape']))
+        glyphs = []
+        for i, font in enumerate(fonts):
+            for char, record in zip(font['text'], font['records']):
+                segments = resolve_segments(record)
+                glyphs += [ { 'char': char, 'code': ord(char), 'font': i, 'points': len(record['x']), 'contours': len(record['contours']),
+                    'lines': len(segments['lines']), 'quads': len(segments['quads']), 'rotated_contours': int(np.count_nonzero(record['rotations'])),
+                    'rotations': int(np.sum(record['rotations'])), 'cubics': int(record['cubics']) } ]
+        stats = {
+            'time': time.perf_counter()-start,
+            'stages': stage_times,
+            'glyphs': glyphs,
+            'rotations': { 'contours': sum(glyph['rotated_contours'] for glyph in glyphs), 'steps': sum(glyph['rotations'] for glyph in glyphs) },
+            'texture': { 'bytes': int(texture.nbytes), 'data_bytes': int(databytes), 'allocated_bytes': allocated, 'padding_bytes': allocated-int(databytes) },
+        }
+        if atlas is not None:
+            stats['texture']['sdf_bytes'] = int(atlas.nbytes)
+        with open(args.statsfile, 'wt') as f:
+            json.dump(stats, f, indent=1)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except PackError as e:
+        print(e)
+        sys.exit(1)
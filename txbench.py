@@ -0,0 +1,190 @@
+# txbench - benchmarks for tx210 texture builds
+# Copyright (C) 2017/2018 Alexander Kraus <nr4@z10.info>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Every combination of font, charset, record format and load scale is built
+# in a fresh process, so the peak resident set size of a case is not
+# inflated by earlier cases. Characters the font does not cover are dropped
+# from the charset. Results are written as JSON, one entry per case, to be
+# compared across commits.
+#
+# The shader cost of a glyph is estimated statically from the texture: the
+# texture fetches dglyph needs to find the glyph in the index, the number of
+# line and spline segments it evaluates and the number of tags it reads.
+
+import argparse
+import freetype
+import json
+import multiprocessing
+import numpy as np
+import os
+import platform
+import subprocess
+import time
+import tx210
+import txrender
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Notify and quit
+def close(str):
+    print(str)
+    exit()
+
+# Fixed benchmark charsets as lists of code points
+charsets = {
+    'ascii': list(range(32, 127)),
+    'latin1': list(range(32, 127)) + list(range(160, 256)),
+    'cyrillic': list(range(0x400, 0x500)),
+    'cjk': list(range(0x4e00, 0x4e00+2000)),
+}
+
+# Number of texture fetches glyphoffset needs for the glyph at position i of
+# the index of texture, including the header read of dglyph
+def index_fetches(texture, i):
+    header = int(texture[0])
+    type = header & 15 if header >= tx210.header_flag else 0
+    if type == 1:
+        return 4
+    if type == 2:
+        return 6
+    # Linear scan: header, number of glyphs, code points up to and including
+    # the glyph's and its offset
+    return 4 + i
+
+# Static shader cost of every glyph of text in texture. Returns a dict of
+# per-glyph arrays of index fetches, segments and tag reads.
+def glyph_costs(texture, text, records):
+    cost = { 'index_fetches': [], 'segments': [], 'tag_reads': [] }
+    format = None
+    for i, (char, record) in enumerate(zip(text, records)):
+        glyph = txrender.decode_glyph(texture, ord(char))
+        format = glyph['format']
+        nsegments = len(glyph['lines']) + len(glyph['quads'])
+        cost['index_fetches'] += [ index_fetches(texture, i) ]
+        cost['segments'] += [ nsegments ]
+        # The stack machine reads the tags of every point and reads the end
+        # point of every segment again as the start of the next one.
+        if format == 'points':
+            cost['tag_reads'] += [ len(record['x']) + nsegments ]
+        elif format == 'packed' or format == 'pooled':
+            cost['tag_reads'] += [ len(record['x']) ]
+        else:
+            cost['tag_reads'] += [ 0 ]
+    return { key: np.array(value, dtype=int) for key, value in cost.items() }
+
+# Build one case and return its measurements. Runs in the benchmark process.
+def run_case(fontfile, codes, format, index, loadscale, repeat):
+    tx210.loadscale = loadscale
+    text = [ chr(code) for code in codes ]
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        texture, meta = tx210.build_texture(fontfile, text, index, format)
+        times += [ time.perf_counter()-start ]
+    cost = glyph_costs(texture, meta['text'], meta['records'])
+    total = cost['index_fetches'] + cost['segments'] + cost['tag_reads']
+    result = {
+        'time': min(times),
+        'bytes': int(texture.nbytes),
+        'texture_size': meta['texture_size'],
+        'index': meta['index'],
+        'cost': { key: { 'mean': float(value.mean()), 'max': int(value.max()) } for key, value in dict(cost, total=total).items() } if len(text) != 0 else {},
+    }
+    if meta['atlas'] is not None:
+        result['sdf_bytes'] = int(meta['atlas'].nbytes)
+    return result
+
+# Process entry point: run the case and send the result or the error
+# message of tx210 through the pipe
+def case_worker(connection, args):
+    try:
+        result = run_case(*args)
+    except tx210.PackError as e:
+        result = { 'error': str(e) }
+    # Peak resident set size in bytes; Linux reports KiB
+    if resource != None:
+        result['peak_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*(1 if platform.system() == 'Darwin' else 1024)
+    connection.send(result)
+    connection.close()
+
+# Run a case in a fresh process
+def measure(fontfile, codes, format, index, loadscale, repeat=1):
+    receiver, sender = multiprocessing.Pipe(False)
+    process = multiprocessing.get_context('spawn').Process(target=case_worker, args=(sender, (fontfile, codes, format, index, loadscale, repeat)))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = { 'error': 'Benchmark process failed.' }
+    process.join()
+    return result
+
+# Code points of codes that the font covers
+def covered(fontfile, codes):
+    font = freetype.Face(fontfile)
+    return [ code for code in codes if font.get_char_index(code) != 0 ]
+
+# Current commit of the working tree, if it is a git checkout
+def revision():
+    try:
+        return subprocess.check_output([ 'git', 'rev-parse', '--short', 'HEAD' ], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks for tx210 texture builds.')
+    parser.add_argument('-f', '--fontfile', dest='fontfiles', action='append', help='Font file to benchmark; can be given several times.')
+    parser.add_argument('-o', '--output', dest='outfile', help='JSON file for the results.')
+    parser.add_argument('-c', '--charset', dest='charsets', action='append', choices=list(charsets), help='Charset to benchmark; can be given several times. All charsets by default.')
+    parser.add_argument('-r', '--records', dest='formats', action='append', choices=tx210.record_formats, help='Record format to benchmark; can be given several times. points by default.')
+    parser.add_argument('-i', '--index', dest='index', default='auto', choices=tx210.index_types+['auto'], help='Glyph index layout.')
+    parser.add_argument('-l', '--loadscale', dest='loadscales', type=int, action='append', help='Load scale to benchmark; can be given several times. tx210\'s default by default.')
+    parser.add_argument('-n', '--repeat', dest='repeat', type=int, default=3, help='Number of builds per case; the fastest counts.')
+    args, rest = parser.parse_known_args()
+
+    if args.fontfiles == None:
+        close("No font file specified. Doing nothing.")
+    names = args.charsets if args.charsets != None else list(charsets)
+    formats = args.formats if args.formats != None else [ 'points' ]
+    loadscales = args.loadscales if args.loadscales != None else [ tx210.loadscale ]
+
+    results = []
+    for fontfile in args.fontfiles:
+        for name in names:
+            codes = covered(fontfile, charsets[name])
+            for format in formats:
+                for loadscale in loadscales:
+                    case = { 'font': fontfile, 'charset': name, 'glyphs': len(codes), 'missing': len(charsets[name])-len(codes), 'format': format, 'loadscale': loadscale }
+                    if len(codes) == 0:
+                        case['error'] = "Font does not cover the charset."
+                    else:
+                        case.update(measure(fontfile, codes, format, args.index, loadscale, args.repeat))
+                    results += [ case ]
+                    if 'error' in case:
+                        print("{font} {charset} {format} {loadscale}: {error}".format(**case))
+                    else:
+                        print("{font} {charset} {format} {loadscale}: {glyphs} glyphs, {time:.3f} s, {bytes} bytes, texture size {texture_size}, {cost[total][mean]:.1f} fetches per glyph".format(**case))
+
+    report = { 'revision': revision(), 'python': platform.python_version(), 'numpy': np.__version__, 'results': results }
+    if args.outfile == None:
+        print(json.dumps(report, indent=1))
+    else:
+        with open(args.outfile, 'wt') as f:
+            json.dump(report, f, indent=1)
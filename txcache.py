@@ -0,0 +1,107 @@
+# txcache - persistent glyph record cache for tx210
+# Copyright (C) 2017/2018 Alexander Kraus <nr4@z10.info>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Processed glyph records are stored as one .npz file per glyph. The file
+# name is the hash of the font file content, the load scale, the tolerance
+# of the cubic spline conversion, the character and the record version, so
+# entries never have to be invalidated. The
+# modification time of an entry is refreshed on every hit; when the cache
+# directory grows beyond its size limit, the least recently used entries
+# are removed first.
+
+import hashlib
+import numpy as np
+import os
+import tempfile
+import zipfile
+
+# Bump this whenever the layout of the glyph records changes.
+version = 3
+
+# Hash of the font file content
+def file_hash(filename):
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1<<20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+class GlyphCache:
+    def __init__(self, path, fonthash, loadscale, maxsize=64*1024*1024, cubictolerance=None):
+        self.path = path
+        self.prefix = '{:s}:{:d}:{!r}:{:d}:'.format(fonthash, loadscale, cubictolerance, version)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+    # File name of the entry for char
+    def filename(self, char):
+        key = hashlib.sha1((self.prefix + char).encode('utf-8')).hexdigest()
+        return os.path.join(self.path, key + '.npz')
+
+    # Return the glyph record for char or None if it is not cached
+    def get(self, char):
+        filename = self.filename(char)
+        try:
+            with np.load(filename) as data:
+                record = { key: data[key] for key in data.files }
+            os.utime(filename)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile):
+            # Truncated or corrupt entry; remove it, so it is written again
+            self.misses += 1
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            return None
+        # Scalars are stored as 0-d arrays
+        for key in record:
+            if record[key].ndim == 0:
+                record[key] = int(record[key])
+        self.hits += 1
+        return record
+
+    # Store the glyph record for char. The entry is written to a temporary
+    # file first, so concurrent builds never see partial entries.
+    def put(self, char, record):
+        fd, tmpname = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **record)
+        os.replace(tmpname, self.filename(char))
+
+    # Remove least recently used entries until the cache fits into maxsize
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.npz'):
+                stat = entry.stat()
+                entries += [ (stat.st_mtime, stat.st_size, entry.path) ]
+        size = sum(entry[1] for entry in entries)
+        for mtime, entrysize, filename in sorted(entries):
+            if size <= self.maxsize:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            size -= entrysize
+
+    def report(self):
+        return "Glyph cache: {:d} hits, {:d} misses.".format(self.hits, self.misses)
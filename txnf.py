@@ -16,390 +16,248 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #/
 
-from Tkinter import Tk, Label, Button
 import argparse
-import freetype
-import numpy as np
-import matplotlib.pyplot as plt
-import cycler
-from math import factorial
 
-# parse command line
-parser = argparse.ArgumentParser(description='Shader Text Generation Tool.')
-#parser.add_argument('-f', '--fontfile', dest='fontfile')
-parser.add_argument('-s', '--size', dest='size')
-parser.add_argument('-o', '--output', dest='outfile')
-parser.add_argument('-p', '--plot', dest='plot', action='store_true')
-parser.add_argument('-x', '--xoffset', dest='xoffset')
-parser.add_argument('-y', '--yoffset', dest='yoffset')
-args, rest = parser.parse_known_args()
+# Glyph shapes: line segments as pairs of points, quadratic splines as triples
+# of points and the advance, in glyph units
+glyphs = {
+    'a' : ( [ [2.,0.], [2.,2.] ],
+        [ [1.,2.], [0.,2.], [0.,1.], [0.,1.], [0.,0.], [1.,0.], [1.,0.], [2.,0.], [2., 1.], [1.,2.], [2.,2.], [2.,1.] ],
+        3. ),
+    'A' : ( [ [0.,0.], [0.,3.], [2.,0.], [2.,3.], [0.,2.], [2.,2.] ],
+        [ [2.,3.], [2.,4.], [1.,4.], [1.,4.], [0.,4.], [0.,3.] ],
+        3. ),
+    'b' : ( [ [0.,0.], [0.,4.], [0.,0.], [1.,0.], [0.,2.], [1.,2.] ],
+        [ [1.,0.], [2.,0.], [2.,1.], [2.,1.], [2.,2.], [1.,2.] ],
+        3. ),
+    'B' : ( [ [0.,0.], [0.,4.], [0.,0.], [1.,0.], [0.,2.], [1.,2.], [0.,4.], [1.,4.] ],
+        [ [1.,0.], [2.,0.], [2.,1.], [2.,1.], [2.,2.], [1.,2.], [1.,2.], [2.,2.], [2.,3.], [2.,3.], [2.,4.], [1.,4.] ],
+        3. ),
+    'c' : ( [ [2.,2.], [1.,2.], [2.,0.], [1.,0.] ],
+        [ [1.,2.], [0.,2.], [0.,1.], [0.,1.], [0.,0.], [1.,0.] ],
+        3. ),
+    'C' : ( [ [2.,0.], [1.,0.], [2.,4.], [1.,4.], [0.,1.], [0.,3.] ],
+        [ [1., 0.], [0.,0.], [0.,1.], [0.,3.], [0.,4.], [1.,4.] ],
+        3. ),
+    'd' : ( [ [1.,2.], [2.,2.], [1.,0.], [2.,0.], [2.,0.], [2.,4.] ],
+        [ [1.,0.], [0.,0.], [0.,1.], [0.,1.], [0.,2.], [1.,2.] ],
+        3. ),
+    'D' : ( [ [0.,0.], [0., 4.], [0., 4.], [1., 4.], [0., 0.], [1., 0.], [2., 1.], [2., 3.] ],
+        [ [1., 4.], [2., 4.], [2., 3.], [1., 0.], [2., 0.], [2., 1.] ],
+        3. ),
+    'e' : ( [ [1.,0.], [2.,0.], [0., 1.], [2., 1.] ],
+        [ [2.,1.],[2.,2.],[1.,2.], [1.,2.], [0.,2.], [0.,1.],[0.,1.],[0.,0.],[1.,0.] ],
+        3. ),
+    'E' : ( [ [0.,0.], [0.,4.], [0.,0.], [2.,0.], [0.,2.], [2.,2.], [0.,4.], [2.,4.] ],
+        [],
+        3. ),
+    'f' : ( [ [1.,1.],[1.,3.], [0.,2.], [2.,2.] ],
+        [ [0.,0.],[1.,0.],[1.,1.], [1.,3.], [1.,4.], [2.,4.] ],
+        3. ),
+    'F' : ( [ [0.,0.], [0.,4.], [0.,4.], [2.,4.], [0.,2.], [2.,2.] ],
+        [],
+        3. ),
+    'g' : ( [ [2.,2.], [2.,-1.], [1.,-2.], [0.,-2.] ],
+        [ [2.,1.], [2.,2.], [1.,2.], [1.,2.], [0.,2.], [0.,1.], [0.,1.], [0.,0.], [1.,0.], [1.,0.], [2.,0.], [2.,1.], [2.,-1.], [2.,-2.], [1.,-2.] ],
+        3. ),
+    'G' : ( [ [1.,2.], [2.,2.], [2.,2.], [2.,1.], [0.,1.], [0.,3.], [1.,4.], [2.,4.] ],
+        [ [0.,3.], [0.,4.], [1.,4.], [1.,0.], [0.,0.], [0.,1.], [1.,0.], [2.,0.], [2.,1.] ],
+        3. ),
+    'h' : ( [ [0.,0.], [0.,4.], [2.,0.], [2.,1.], [1.,2.], [0.,2.] ],
+        [ [2.,1.], [2.,2.], [1.,2.] ],
+        3. ),
+    'H' : ( [ [0.,0.], [0.,4.], [2.,0.], [2.,4.], [0.,2.], [2.,2.] ],
+        [],
+        3. ),
+    'i' : ( [ [0.,1.], [0.,2.], [0.,3.], [0.,3.] ],
+        [ [0.,1.], [0.,0.], [1.,0.] ],
+        2. ),
+    'I' : ( [ [1.,0.], [1.,4.], [0., 0.], [2.,0.], [0.,4.], [2.,4.] ],
+        [],
+        3. ),
+    'j' : ( [ [1.,2.], [1.,-1.], [1.,3.], [1.,3.] ],
+        [ [1.,-1.], [1.,-2.], [0.,-2.] ],
+        2. ),
+    'J' : ( [ [0.,4.], [1.,4.], [1.,4.], [1.,1.] ],
+        [ [1.,1.], [1.,0.], [0.,0.] ],
+        2. ),
+    'k' : ( [ [0.,0.], [0.,4.], [0.,1.], [1.,1.] ],
+        [ [1.,1.],[2.,1.], [2.,2.], [1.,1.], [2.,1.], [2.,0.] ],
+        3. ),
+    'K' : ( [ [0.,0.], [0.,4.], [0.,2.], [1.,2.], [2.,3.], [2.,4.], [2.,0.], [2.,1.] ],
+        [ [1.,2.],[2.,2.], [2.,3.], [1.,2.], [2.,2.], [2.,1.] ],
+        3. ),
+    'l' : ( [ [0.,1.], [0.,4.] ],
+        [ [0.,1.], [0.,0.], [1.,0.] ],
+        2. ),
+    'L' : ( [ [0.,0.],[0.,4.] ,[0.,0.],[2.,0.]],
+        [],
+        3. ),
+    'm' : ( [ [0.,0.], [0.,2.], [2.,0.], [2.,1.], [4.,0.], [4.,1.] ],
+        [ [0.,1.], [0.,2.], [1.,2.], [1.,2.], [2.,2.], [2.,1.], [2.,1.], [2.,2.], [3., 2.], [3.,2.], [4.,2.], [4.,1.] ],
+        5. ),
+    'M' : ( [ [0.,0.], [0.,4.], [4.,0.], [4.,4.], [0.,4.], [2.,2.], [2.,2.], [4.,4.]],
+        [],
+        5. ),
+    'n' : ( [ [0.,0.], [0., 2.], [2.,1.], [2.,0.] ],
+        [ [1.,2.], [2.,2.], [2.,1.], [0., 1.], [0.,2.], [1.,2.]],
+        3. ),
+    'N' : ( [ [0.,0.], [0.,4.], [0.,4.], [2.,0.], [2.,0.], [2.,4.] ],
+        [],
+        3. ),
+    'o' : ( [],
+        [ [1.,0.],[0.,0.],[0.,1.], [0.,1.],[0.,2.],[1.,2.], [1.,2.],[2.,2.],[2.,1.], [2.,1.],[2.,0.],[1.,0.] ],
+        3. ),
+    'O' : ( [ [0.,1.], [0.,3.], [2.,1.], [2.,3.] ],
+        [ [0.,1.], [0.,0.], [1.,0.], [1.,0.], [2.,0.], [2.,1.], [2.,3.], [2.,4.], [1.,4.], [1.,4.],[0.,4.],[0.,3.] ],
+        3. ),
+    'p' : ( [ [0.,-2.], [0.,2.], [0.,2.], [1.,2.], [0.,0.], [1.,0.] ],
+        [ [1.,0.], [2.,0.], [2.,1.], [2.,1.], [2.,2.], [1.,2.] ],
+        3. ),
+    'P' : ( [ [0.,0.], [0.,4.], [0.,4.], [1.,4.], [0.,2.], [1.,2.] ],
+        [ [1.,2.], [2.,2.], [2.,3.], [2.,3.],[2.,4.],[1.,4.] ],
+        3. ),
+    'q' : ( [ [2.,2.], [2.,-2.], [2.,2.],[1.,2.] ],
+        [ [2.,1.],[2.,0.],[1.,0.],[1.,0.],[0.,0.],[0.,1.],[0.,1.],[0.,2.],[1.,2.] ],
+        3. ),
+    'Q' : ( [ [0.,1.], [0.,3.], [2.,1.], [2.,3.] ],
+        [ [0.,1.],[0.,0.],[1.,0.], [1.,0.], [2.,0.],[2.,1.], [2.,3.],[2.,4.],[1.,4.], [1.,4.], [0.,4.], [0.,3.], [1.,1.],[1.,0.],[2.,0.] ],
+        3. ),
+    'r' : ( [ [0.,0.], [0.,2.] ],
+        [ [0.,1.], [0.,2.], [1.,2.] ],
+        2. ),
+    'R' : ( [ [0.,0.], [0.,4.], [0.,4.], [1.,4.], [0.,2.], [1.,2.], [2.,1.], [2.,0.] ],
+        [ [1.,4.], [2.,4.], [2.,3.], [2.,3.], [2.,2.], [1.,2.], [1.,2.], [2.,2.], [2.,1.] ],
+        3. ),
+    's' : ( [ [0.,0.], [1.,0.], [1.,2.], [2.,2.] ],
+        [ [1.,0.], [3.,.5], [1.,1.], [1.,1.], [-1.,1.5], [1.,2.] ],
+        3. ),
+    'S' : ( [ [0.,0.], [1.,0.], [2.,4.], [1.,4.] ],
+        [ [1.,0.], [2.,0.], [2.,1.], [2.,1.], [2.,2.], [1.,2.], [1.,2.], [0.,2.], [0.,3.], [0., 3.], [0.,4.], [1.,4.] ],
+        3. ),
+    't' : ( [ [1.,1.], [1.,4.], [0.,2.], [2.,2.] ],
+        [ [1.,1.], [1.,0.], [2.,0.] ],
+        3. ),
+    'T' : ( [ [1.,0.], [1.,4.], [0.,4.], [2.,4.] ],
+        [],
+        3. ),
+    'u' : ( [ [0.,2.], [0.,1.], [2.,2.], [2.,0.] ],
+        [ [0.,1.], [0.,0.], [1.,0.], [1.,0.], [2.,0.], [2.,1.] ],
+        3. ),
+    'U' : ( [ [0.,1.], [0.,4.], [2.,1.], [2.,4.] ],
+        [ [0.,1.], [0.,0.], [1.,0.], [1.,0.], [2.,0.], [2.,1.] ],
+        3. ),
+    'v' : ( [ [0.,2.], [1.,0.], [1.,0.], [2.,2.] ],
+        [],
+        3. ),
+    'V' : ( [ [0.,4.], [1.,0.], [1.,0.], [2.,4.] ],
+        [],
+        3. ),
+    'w' : ( [ [0.,2.], [0.,1.], [2.,2.], [2.,1.], [4.,2.], [4.,1.] ],
+        [ [0.,1.], [0.,0.], [1.,0.], [1.,0.], [2.,0.], [2.,1.], [2.,1.], [2.,0.], [3.,0.], [3.,0.], [4.,0.], [4.,1.] ],
+        5. ),
+    'W' : ( [ [0.,4.], [0.,1.], [2.,4.], [2.,1.], [4.,4.], [4.,1.] ],
+        [ [0.,1.], [0.,0.], [1.,0.], [1.,0.], [2.,0.], [2.,1.], [2.,1.], [2.,0.], [3.,0.], [3.,0.], [4.,0.], [4.,1.] ],
+        5. ),
+    'x' : ( [],
+        [ [0.,2.], [1.,2.], [1.,1.], [1.,1.], [1.,0.], [0.,0.], [2.,2.], [1.,2.], [1.,1.], [1.,1.], [1.,0.], [2.,0.] ],
+        3. ),
+    'X' : ( [ [0.,0.], [2.,4.], [0.,4.], [2.,0.] ],
+        [],
+        3. ),
+    'y' : ( [ [0.,2.], [0.,1.], [2.,2.], [2.,-1.], [1.,-2.], [0.,-2.] ],
+        [ [0.,1.], [0.,0.], [1.,0.], [1.,0.], [2.,0.], [2.,1.], [2.,-1.], [2.,-2.], [1.,-2.] ],
+        3. ),
+    'Y' : ( [ [0.,4.], [1.,2.], [1.,2.], [2.,4.], [1.,2.], [1.,0.] ],
+        [],
+        3. ),
+    'z' : ( [ [2.,2.], [0.,2.], [2.,2.], [0.,0.], [0.,0.], [2.,0.] ],
+        [],
+        3. ),
+    'Z' : ( [ [0., 4.], [2.,4.], [2.,4.], [0.,0.], [0.,0.], [2.,0.] ],
+        [],
+        3. ),
+    '0' : ( [ [0.,1.], [0.,3.], [2.,1.], [2.,3.] ],
+        [ [0.,1.], [0.,0.], [1.,0.], [1.,0.], [2.,0.], [2.,1.], [2.,3.], [2.,4.], [1.,4.], [1.,4.],[0.,4.],[0.,3.] ],
+        3. ),
+    '1' : ( [ [0.,3.], [1.,4.], [1.,4.], [1.,0.] ],
+        [],
+        2. ),
+    '2' : ( [ [0.,0.], [2.,0.] ],
+        [ [0.,4.], [3.,5.], [0.,0.] ],
+        3. ),
+    '3' : ( [ [0.,4.], [1.,4.], [0.,2.], [1.,2.], [0.,0.], [1.,0.] ],
+        [ [1.,4.], [2.,4.], [2.,3.], [2.,3.], [2.,2.], [1.,2.], [1.,2.], [2.,2.], [2.,1.], [2.,1.], [2.,0.], [1.,0.] ],
+        3. ),
+    '4' : ( [ [2.,4.], [0.,1.], [0.,1.], [2.,1.], [2.,2.], [2.,0.] ],
+        [],
+        3. ),
+    '5' : ( [ [0.,4.], [2.,4.], [0.,4.], [0.,2.], [0.,2.], [1.,2.] ],
+        [ [1.,2.], [2.,2.], [2.,1.], [2.,1.], [2.,0.], [1.,0.], [1.,0.], [0.,0.], [0.,1.] ],
+        3. ),
+    '6' : ( [ [0.,1.], [0.,3.], [1.,4.], [2.,4.] ],
+        [ [0.,3.], [0.,4.], [1.,4.], [0.,1.], [0.,2.], [1.,2.], [1.,2.], [2.,2.], [2.,1.], [2.,1.], [2.,0.], [1.,0.], [1.,0.], [0.,0.], [0.,1.] ],
+        3. ),
+    '7' : ( [ [0.,4.], [2.,4.], [2.,4.], [0.,0.] ],
+        [],
+        3. ),
+    '8' : ( [],
+        [ [0.,1.], [0.,2.], [1.,2.], [1.,2.], [2.,2.], [2.,1.], [2.,1.], [2.,0.], [1.,0.], [1.,0.], [0.,0.], [0.,1.], [0.,3.], [0.,4.], [1.,4.], [1.,4.], [2.,4.], [2.,3.], [2.,3.], [2.,2.], [1.,2.], [1.,2.], [0.,2.], [0.,3.] ],
+        3. ),
+    '9' : ( [ [2.,3.], [2.,1.], [1.,0.], [0.,0.] ],
+        [ [0.,3.], [0.,4.], [1.,4.], [1.,4.], [2.,4.], [2.,3.], [2.,3.], [2.,2.], [1.,2.], [1.,2.], [0.,2.], [0.,3.], [2.,1.], [2.,0.], [1.,0.] ],
+        3. ),
+    ' ' : ( [],
+        [],
+        2. ),
+    '/' : ( [ [0.,0.], [2.,4.] ],
+        [],
+        3. ),
+    ':' : ( [ [0.,1.], [0.,1.], [0.,3.], [0.,3.] ],
+        [],
+        1. ),
+    '-' : ( [ [0.,2.], [2.,2.] ],
+        [],
+        3. ),
+    '.' : ( [ [0.,0.], [0.,0.] ],
+        [],
+        1. ),
+}
 
-text = rest[0]
-unit = float(args.size)/6.
+# Line segments (pairs of points) and quadratic splines (triples of points)
+# of the glyphs of text, scaled by unit and starting at xpos, ypos (in glyph
+# units). Returns the lists of points lin and quad.
+def outlines(text, unit, xpos=0., ypos=0.):
+    lin = []
+    quad = []
+    for c, x in instances(text, xpos) :
+        lin0, quad0, advance = glyphs[c]
+        lin += [ [ (x + lini[0]) * unit, (ypos + lini[1]) * unit ] for lini in lin0 ]
+        quad += [ [ (x + quadi[0]) * unit, (ypos + quadi[1]) * unit ] for quadi in quad0 ]
+    return lin, quad
 
-# compute outlines
-lin = []
-quad = []
-xpos = 0.
-ypos = 0.
-if args.xoffset != None :
-    xpos = float(args.xoffset[1:-1])/unit
-if args.yoffset != None :
-    ypos = float(args.yoffset[1:-1])/unit
-def rescale(lin0, quad0) :
-    global lin, quad, xpos, unit, ypos
-    lin0 = [ [ (xpos + lini[0]) * unit, (ypos + lini[1]) * unit ] for lini in lin0 ]
-    lin += lin0
-    quad0 = [ [ (xpos + quadi[0]) * unit, (ypos + quadi[1]) * unit ] for quadi in quad0 ]
-    quad += quad0
-    return 
-for c in text :
-    if c == 'a' :
-        lin0 = [ [2.,0.], [2.,2.] ]
-        quad0 = [ [1.,2.], [0.,2.], [0.,1.], [0.,1.], [0.,0.], [1.,0.], [1.,0.], [2.,0.], [2., 1.], [1.,2.], [2.,2.], [2.,1.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'A' :
-        lin0 = [ [0.,0.], [0.,3.], [2.,0.], [2.,3.], [0.,2.], [2.,2.] ]
-        quad0 = [ [2.,3.], [2.,4.], [1.,4.], [1.,4.], [0.,4.], [0.,3.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'b' :
-        lin0 = [ [0.,0.], [0.,4.], [0.,0.], [1.,0.], [0.,2.], [1.,2.] ]
-        quad0 = [ [1.,0.], [2.,0.], [2.,1.], [2.,1.], [2.,2.], [1.,2.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'B' :
-        lin0 = [ [0.,0.], [0.,4.], [0.,0.], [1.,0.], [0.,2.], [1.,2.], [0.,4.], [1.,4.] ]
-        quad0 = [ [1.,0.], [2.,0.], [2.,1.], [2.,1.], [2.,2.], [1.,2.], [1.,2.], [2.,2.], [2.,3.], [2.,3.], [2.,4.], [1.,4.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'c' :
-        lin0 = [ [2.,2.], [1.,2.], [2.,0.], [1.,0.] ]
-        quad0 = [ [1.,2.], [0.,2.], [0.,1.], [0.,1.], [0.,0.], [1.,0.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'C' :
-        lin0 = [ [2.,0.], [1.,0.], [2.,4.], [1.,4.], [0.,1.], [0.,3.] ]
-        quad0 = [ [1., 0.], [0.,0.], [0.,1.], [0.,3.], [0.,4.], [1.,4.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'd' :
-        lin0 = [ [1.,2.], [2.,2.], [1.,0.], [2.,0.], [2.,0.], [2.,4.] ]
-        quad0 = [ [1.,0.], [0.,0.], [0.,1.], [0.,1.], [0.,2.], [1.,2.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'D' :
-        lin0 = [ [0.,0.], [0., 4.], [0., 4.], [1., 4.], [0., 0.], [1., 0.], [2., 1.], [2., 3.] ]
-        quad0 = [ [1., 4.], [2., 4.], [2., 3.], [1., 0.], [2., 0.], [2., 1.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'e' :
-        lin0 = [ [1.,0.], [2.,0.], [0., 1.], [2., 1.] ]
-        quad0 = [ [2.,1.],[2.,2.],[1.,2.], [1.,2.], [0.,2.], [0.,1.],[0.,1.],[0.,0.],[1.,0.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'E' :
-        lin0 = [ [0.,0.], [0.,4.], [0.,0.], [2.,0.], [0.,2.], [2.,2.], [0.,4.], [2.,4.] ]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'f' :
-        lin0 = [ [1.,1.],[1.,3.], [0.,2.], [2.,2.] ]
-        quad0 = [ [0.,0.],[1.,0.],[1.,1.], [1.,3.], [1.,4.], [2.,4.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'F' :
-        lin0 = [ [0.,0.], [0.,4.], [0.,4.], [2.,4.], [0.,2.], [2.,2.] ]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'g' :
-        lin0 = [ [2.,2.], [2.,-1.], [1.,-2.], [0.,-2.] ]
-        quad0 = [ [2.,1.], [2.,2.], [1.,2.], [1.,2.], [0.,2.], [0.,1.], [0.,1.], [0.,0.], [1.,0.], [1.,0.], [2.,0.], [2.,1.], [2.,-1.], [2.,-2.], [1.,-2.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'G' :
-        lin0 = [ [1.,2.], [2.,2.], [2.,2.], [2.,1.], [0.,1.], [0.,3.], [1.,4.], [2.,4.] ]
-        quad0 = [ [0.,3.], [0.,4.], [1.,4.], [1.,0.], [0.,0.], [0.,1.], [1.,0.], [2.,0.], [2.,1.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'h' :
-        lin0 = [ [0.,0.], [0.,4.], [2.,0.], [2.,1.], [1.,2.], [0.,2.] ]
-        quad0 = [ [2.,1.], [2.,2.], [1.,2.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c== 'H' :
-        lin0 = [ [0.,0.], [0.,4.], [2.,0.], [2.,4.], [0.,2.], [2.,2.] ]
-        quad0 = [] 
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'i' :
-        lin0 = [ [0.,1.], [0.,2.], [0.,3.], [0.,3.] ]
-        quad0 = [ [0.,1.], [0.,0.], [1.,0.] ]
-        rescale(lin0, quad0)
-        xpos += 2.
-    elif c == 'I' :
-        lin0 = [ [1.,0.], [1.,4.], [0., 0.], [2.,0.], [0.,4.], [2.,4.] ]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'j' :
-        lin0 = [ [1.,2.], [1.,-1.], [1.,3.], [1.,3.] ]
-        quad0 = [ [1.,-1.], [1.,-2.], [0.,-2.] ]
-        rescale(lin0, quad0)
-        xpos += 2.
-    elif c == 'J' :
-        lin0 = [ [0.,4.], [1.,4.], [1.,4.], [1.,1.] ]
-        quad0 = [ [1.,1.], [1.,0.], [0.,0.] ]
-        rescale(lin0, quad0)
-        xpos += 2.
-    elif c == 'k' :
-        lin0 = [ [0.,0.], [0.,4.], [0.,1.], [1.,1.] ]
-        quad0 = [ [1.,1.],[2.,1.], [2.,2.], [1.,1.], [2.,1.], [2.,0.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'K' :
-        lin0 = [ [0.,0.], [0.,4.], [0.,2.], [1.,2.], [2.,3.], [2.,4.], [2.,0.], [2.,1.] ]
-        quad0 = [ [1.,2.],[2.,2.], [2.,3.], [1.,2.], [2.,2.], [2.,1.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'l' :
-        lin0 = [ [0.,1.], [0.,4.] ]
-        quad0 = [ [0.,1.], [0.,0.], [1.,0.] ]
-        rescale(lin0, quad0)
-        xpos += 2.
-    elif c == 'L' :
-        lin0 = [ [0.,0.],[0.,4.] ,[0.,0.],[2.,0.]]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'm' :
-        lin0 = [ [0.,0.], [0.,2.], [2.,0.], [2.,1.], [4.,0.], [4.,1.] ]
-        quad0 = [ [0.,1.], [0.,2.], [1.,2.], [1.,2.], [2.,2.], [2.,1.], [2.,1.], [2.,2.], [3., 2.], [3.,2.], [4.,2.], [4.,1.] ]
-        rescale(lin0, quad0)
-        xpos += 5.
-    elif c == 'M':
-        lin0 = [ [0.,0.], [0.,4.], [4.,0.], [4.,4.], [0.,4.], [2.,2.], [2.,2.], [4.,4.]]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 5.
-    elif c == 'n' :
-        lin0 = [ [0.,0.], [0., 2.], [2.,1.], [2.,0.] ]
-        quad0 = [ [1.,2.], [2.,2.], [2.,1.], [0., 1.], [0.,2.], [1.,2.]]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'N' :
-        lin0 = [ [0.,0.], [0.,4.], [0.,4.], [2.,0.], [2.,0.], [2.,4.] ]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'o' :
-        lin0 = []
-        quad0 = [ [1.,0.],[0.,0.],[0.,1.], [0.,1.],[0.,2.],[1.,2.], [1.,2.],[2.,2.],[2.,1.], [2.,1.],[2.,0.],[1.,0.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'O' :
-        lin0 = [ [0.,1.], [0.,3.], [2.,1.], [2.,3.] ]
-        quad0 = [ [0.,1.], [0.,0.], [1.,0.], [1.,0.], [2.,0.], [2.,1.], [2.,3.], [2.,4.], [1.,4.], [1.,4.],[0.,4.],[0.,3.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'p' :
-        lin0 = [ [0.,-2.], [0.,2.], [0.,2.], [1.,2.], [0.,0.], [1.,0.] ]
-        quad0 = [ [1.,0.], [2.,0.], [2.,1.], [2.,1.], [2.,2.], [1.,2.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'P' :
-        lin0 = [ [0.,0.], [0.,4.], [0.,4.], [1.,4.], [0.,2.], [1.,2.] ]
-        quad0 = [ [1.,2.], [2.,2.], [2.,3.], [2.,3.],[2.,4.],[1.,4.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'q' :
-        lin0 = [ [2.,2.], [2.,-2.], [2.,2.],[1.,2.] ]
-        quad0 = [ [2.,1.],[2.,0.],[1.,0.],[1.,0.],[0.,0.],[0.,1.],[0.,1.],[0.,2.],[1.,2.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'Q' :
-        lin0 = [ [0.,1.], [0.,3.], [2.,1.], [2.,3.] ]
-        quad0 = [ [0.,1.],[0.,0.],[1.,0.], [1.,0.], [2.,0.],[2.,1.], [2.,3.],[2.,4.],[1.,4.], [1.,4.], [0.,4.], [0.,3.], [1.,1.],[1.,0.],[2.,0.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'r' :
-        lin0 = [ [0.,0.], [0.,2.] ]
-        quad0 = [ [0.,1.], [0.,2.], [1.,2.] ]
-        rescale(lin0, quad0) 
-        xpos += 2.
-    elif c == 'R' :
-        lin0 = [ [0.,0.], [0.,4.], [0.,4.], [1.,4.], [0.,2.], [1.,2.], [2.,1.], [2.,0.] ]
-        quad0 = [ [1.,4.], [2.,4.], [2.,3.], [2.,3.], [2.,2.], [1.,2.], [1.,2.], [2.,2.], [2.,1.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 's' :
-        lin0 = [ [0.,0.], [1.,0.], [1.,2.], [2.,2.] ]
-        quad0 = [ [1.,0.], [3.,.5], [1.,1.], [1.,1.], [-1.,1.5], [1.,2.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'S' :
-        lin0 = [ [0.,0.], [1.,0.], [2.,4.], [1.,4.] ]
-        quad0 = [ [1.,0.], [2.,0.], [2.,1.], [2.,1.], [2.,2.], [1.,2.], [1.,2.], [0.,2.], [0.,3.], [0., 3.], [0.,4.], [1.,4.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 't' :
-        lin0 = [ [1.,1.], [1.,4.], [0.,2.], [2.,2.] ]
-        quad0 = [ [1.,1.], [1.,0.], [2.,0.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'T' :
-        lin0 = [ [1.,0.], [1.,4.], [0.,4.], [2.,4.] ]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'u' :
-        lin0 = [ [0.,2.], [0.,1.], [2.,2.], [2.,0.] ]
-        quad0 = [ [0.,1.], [0.,0.], [1.,0.], [1.,0.], [2.,0.], [2.,1.] ]
-        rescale(lin0, quad0)
-        xpos += 3
-    elif c == 'U' :
-        lin0 = [ [0.,1.], [0.,4.], [2.,1.], [2.,4.] ]
-        quad0 = [ [0.,1.], [0.,0.], [1.,0.], [1.,0.], [2.,0.], [2.,1.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'v' :
-        lin0 = [ [0.,2.], [1.,0.], [1.,0.], [2.,2.] ]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'V' :
-        lin0 = [ [0.,4.], [1.,0.], [1.,0.], [2.,4.] ]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'w' :
-        lin0 = [ [0.,2.], [0.,1.], [2.,2.], [2.,1.], [4.,2.], [4.,1.] ]
-        quad0 = [ [0.,1.], [0.,0.], [1.,0.], [1.,0.], [2.,0.], [2.,1.], [2.,1.], [2.,0.], [3.,0.], [3.,0.], [4.,0.], [4.,1.] ]
-        rescale(lin0, quad0)
-        xpos += 5.
-    elif c == 'W' :
-        lin0 = [ [0.,4.], [0.,1.], [2.,4.], [2.,1.], [4.,4.], [4.,1.] ]
-        quad0 = [ [0.,1.], [0.,0.], [1.,0.], [1.,0.], [2.,0.], [2.,1.], [2.,1.], [2.,0.], [3.,0.], [3.,0.], [4.,0.], [4.,1.] ]
-        rescale(lin0, quad0)
-        xpos += 5.
-    elif c == 'x' :
-        lin0 = []
-        quad0 = [ [0.,2.], [1.,2.], [1.,1.], [1.,1.], [1.,0.], [0.,0.], [2.,2.], [1.,2.], [1.,1.], [1.,1.], [1.,0.], [2.,0.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'X' :
-        lin0 = [ [0.,0.], [2.,4.], [0.,4.], [2.,0.] ]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'y' :
-        lin0 = [ [0.,2.], [0.,1.], [2.,2.], [2.,-1.], [1.,-2.], [0.,-2.] ]
-        quad0 = [ [0.,1.], [0.,0.], [1.,0.], [1.,0.], [2.,0.], [2.,1.], [2.,-1.], [2.,-2.], [1.,-2.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'Y' :
-        lin0 = [ [0.,4.], [1.,2.], [1.,2.], [2.,4.], [1.,2.], [1.,0.] ]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'z' :
-        lin0 = [ [2.,2.], [0.,2.], [2.,2.], [0.,0.], [0.,0.], [2.,0.] ]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == 'Z' :
-        lin0 = [ [0., 4.], [2.,4.], [2.,4.], [0.,0.], [0.,0.], [2.,0.] ]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == '0' :
-        lin0 = [ [0.,1.], [0.,3.], [2.,1.], [2.,3.] ]
-        quad0 = [ [0.,1.], [0.,0.], [1.,0.], [1.,0.], [2.,0.], [2.,1.], [2.,3.], [2.,4.], [1.,4.], [1.,4.],[0.,4.],[0.,3.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == '1' :
-        lin0 = [ [0.,3.], [1.,4.], [1.,4.], [1.,0.] ]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 2.
-    elif c == '2' :
-        lin0 = [ [0.,0.], [2.,0.] ]
-        quad0 = [ [0.,4.], [3.,5.], [0.,0.] ]
-        rescale(lin0, quad0) 
-        xpos += 3.
-    elif c == '3' :
-        lin0 = [ [0.,4.], [1.,4.], [0.,2.], [1.,2.], [0.,0.], [1.,0.] ]
-        quad0 = [ [1.,4.], [2.,4.], [2.,3.], [2.,3.], [2.,2.], [1.,2.], [1.,2.], [2.,2.], [2.,1.], [2.,1.], [2.,0.], [1.,0.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == '4' :
-        lin0 = [ [2.,4.], [0.,1.], [0.,1.], [2.,1.], [2.,2.], [2.,0.] ]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == '5' :
-        lin0 = [ [0.,4.], [2.,4.], [0.,4.], [0.,2.], [0.,2.], [1.,2.] ]
-        quad0 = [ [1.,2.], [2.,2.], [2.,1.], [2.,1.], [2.,0.], [1.,0.], [1.,0.], [0.,0.], [0.,1.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == '6' :
-        lin0 = [ [0.,1.], [0.,3.], [1.,4.], [2.,4.] ]
-        quad0 = [ [0.,3.], [0.,4.], [1.,4.], [0.,1.], [0.,2.], [1.,2.], [1.,2.], [2.,2.], [2.,1.], [2.,1.], [2.,0.], [1.,0.], [1.,0.], [0.,0.], [0.,1.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == '7' :
-        lin0 = [ [0.,4.], [2.,4.], [2.,4.], [0.,0.] ]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == '8' :
-        lin0 = []
-        quad0 = [ [0.,1.], [0.,2.], [1.,2.], [1.,2.], [2.,2.], [2.,1.], [2.,1.], [2.,0.], [1.,0.], [1.,0.], [0.,0.], [0.,1.], [0.,3.], [0.,4.], [1.,4.], [1.,4.], [2.,4.], [2.,3.], [2.,3.], [2.,2.], [1.,2.], [1.,2.], [0.,2.], [0.,3.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == '9' :
-        lin0 = [ [2.,3.], [2.,1.], [1.,0.], [0.,0.] ]
-        quad0 = [ [0.,3.], [0.,4.], [1.,4.], [1.,4.], [2.,4.], [2.,3.], [2.,3.], [2.,2.], [1.,2.], [1.,2.], [0.,2.], [0.,3.], [2.,1.], [2.,0.], [1.,0.] ]
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == ' ' :
-        lin0 =  []
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 2.
-    elif c == '/' :
-        lin0 = [ [0.,0.], [2.,4.] ]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == ':' :
-        lin0 = [ [0.,1.], [0.,1.], [0.,3.], [0.,3.] ]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 1.
-    elif c == '-' :
-        lin0 = [ [0.,2.], [2.,2.] ]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 3.
-    elif c == '.' :
-        lin0 = [ [0.,0.], [0.,0.] ]
-        quad0 = []
-        rescale(lin0, quad0)
-        xpos += 1.
+# Characters of text that have a glyph with their x positions (in glyph units),
+# starting at xpos
+def instances(text, xpos=0.):
+    result = []
+    for c in text :
+        if c in glyphs :
+            result += [ (c, xpos) ]
+            xpos += glyphs[c][2]
+        xpos += .05
+    return result
 
-    xpos += .05
-
-# plot outlines
-if args.plot :
+# Plot the outlines. matplotlib is only needed here, so it is imported on demand.
+def plot(lin, quad, unit):
+    import cycler
+    import matplotlib.pyplot as plt
+    import numpy as np
     plt.rc('axes', prop_cycle=(cycler.cycler('color', ['r', 'g', 'b', 'c', 'm', 'y', 'k'])))
     fig = plt.figure(figsize=(16,4))
     plt.axes().set_aspect('equal', 'datalim')
     plt.grid(which='major', alpha=unit)
 
-    for i in range(len(lin)/2) :
+    for i in range(len(lin)//2) :
         a = lin[2*i]
         b = lin[2*i+1]
 
@@ -408,7 +266,7 @@ if args.plot :
 
         plt.plot(xp, yp, 'o', markersize=.2)
         
-    for i in range(len(quad)/3) :
+    for i in range(len(quad)//3) :
         a = quad[3*i]
         b = quad[3*i+1]
         c = quad[3*i+2]
@@ -418,21 +276,129 @@ if args.plot :
         
         plt.plot(xp, yp, 'o', markersize=.2)
     plt.show()
-    
-otext = "const vec2 lin["+str(len(lin))+"] = vec2["+str(len(lin))+"]("
-for li in lin :
-    otext += "vec2(" + "%.2e"%li[0]+","+"%.2e"%li[1]+"),"
-otext = otext[:-1]
-otext += "),\nquad["+str(len(quad))+"] = vec2["+str(len(quad))+"]("
-for qi in quad :
-    otext += "vec2(" + "%.2e"%qi[0]+","+"%.2e"%qi[1]+"),"
-otext = otext[:-1]
-otext += ");\nfor(int i=0; i<"+str(len(lin)/2)+";++i) d=min(d,dsg(lin[2*i], lin[2*i+1], uv));\nfor(int i=0; i<"+str(len(quad)/3)+"; ++i) d=min(d,dsp(quad[3*i], quad[3*i+1], quad[3*i+2], uv));\n"
 
-if args.outfile == None :
-    print otext
-else :
-    with open(args.outfile, "wt") as f:
-        f.write(otext)
-        f.close()
-    
+# GLSL source that declares the outlines and accumulates their distance in d
+def glsl(lin, quad):
+    otext = "const vec2 lin["+str(len(lin))+"] = vec2["+str(len(lin))+"]("
+    for li in lin :
+        otext += "vec2(" + "%.2e"%li[0]+","+"%.2e"%li[1]+"),"
+    otext = otext[:-1]
+    otext += "),\nquad["+str(len(quad))+"] = vec2["+str(len(quad))+"]("
+    for qi in quad :
+        otext += "vec2(" + "%.2e"%qi[0]+","+"%.2e"%qi[1]+"),"
+    otext = otext[:-1]
+    otext += ");\nfor(int i=0; i<"+str(len(lin)//2)+";++i) d=min(d,dsg(lin[2*i], lin[2*i+1], uv));\nfor(int i=0; i<"+str(len(quad)//3)+"; ++i) d=min(d,dsp(quad[3*i], quad[3*i+1], quad[3*i+2], uv));\n"
+    return otext
+
+# Horizontal extent of the glyph of c (in glyph units). Splines stay within
+# the hull of their control points, so the extent of all points is used.
+def extent(c):
+    x = [ p[0] for p in glyphs[c][0] + glyphs[c][1] ]
+    return min(x), max(x)
+
+# GLSL source that declares the outlines of every glyph used in text once,
+# scaled by unit, and a list of instances (glyph number, x offset) for the
+# characters of text starting at xpos, ypos (in glyph units). The distance of
+# all instances is accumulated in d. Glyphs without lines or splines and
+# characters without glyph get no instances.
+# With cull set, the x extents of the instances, widened by margin (in glyph
+# units), are emitted as well. Instances are sorted by the left end of their
+# extent, and each pixel finds the last instance starting left of uv.x with a
+# binary search. Only this instance and the few before it that can overlap
+# it are evaluated if their extent contains uv.x; pixels outside of all
+# extents leave d untouched.
+def glsl_instances(text, unit, xpos=0., ypos=0., cull=False, margin=.5):
+    used = []
+    inst = []
+    for c, x in instances(text, xpos) :
+        lin0, quad0, advance = glyphs[c]
+        if lin0 == [] and quad0 == [] :
+            continue
+        if c not in used :
+            used += [ c ]
+        inst += [ (used.index(c), x * unit) ]
+    ext = [ [ (x / unit + extent(used[g])[0] - margin) * unit, (x / unit + extent(used[g])[1] + margin) * unit ] for g, x in inst ]
+    if cull :
+        order = sorted(range(len(inst)), key=lambda k: ext[k][0])
+        inst = [ inst[k] for k in order ]
+        ext = [ ext[k] for k in order ]
+    lin = [ [ p[0] * unit, p[1] * unit ] for c in used for p in glyphs[c][0] ]
+    quad = [ [ p[0] * unit, p[1] * unit ] for c in used for p in glyphs[c][1] ]
+    lins = [ 0 ]
+    quads = [ 0 ]
+    for c in used :
+        lins += [ lins[-1] + len(glyphs[c][0]) ]
+        quads += [ quads[-1] + len(glyphs[c][1]) ]
+    if inst == [] :
+        return ""
+
+    def vec2s(points) :
+        return ",".join("vec2(" + "%.2e"%p[0] + "," + "%.2e"%p[1] + ")" for p in points)
+    def ints(values) :
+        return ",".join(str(v) for v in values)
+    n = str(len(inst))
+    otext = "const vec2 inst["+n+"] = vec2["+n+"]("+vec2s([ [ g, x ] for g, x in inst ])+");\n"
+    otext += "const int lins["+str(len(lins))+"] = int["+str(len(lins))+"]("+ints(lins)+"), quads["+str(len(quads))+"] = int["+str(len(quads))+"]("+ints(quads)+");\n"
+    if lin != [] :
+        otext += "const vec2 lin["+str(len(lin))+"] = vec2["+str(len(lin))+"]("+vec2s(lin)+");\n"
+    if quad != [] :
+        otext += "const vec2 quad["+str(len(quad))+"] = vec2["+str(len(quad))+"]("+vec2s(quad)+");\n"
+    if cull :
+        # Number of instances to look back from the search result: every
+        # extent has to be reached from the last instance starting left of
+        # its right end
+        overlap = max(sum(1 for e in ext if e[0] <= x1) - k for k, (x0, x1) in enumerate(ext))
+        otext += "const vec2 ext["+n+"] = vec2["+n+"]("+vec2s(ext)+");\n"
+        otext += "int lo = 0, hi = "+str(len(inst)-1)+";\n"
+        otext += "while(lo < hi)\n{\n    int mid = (lo+hi+1)/2;\n    if(ext[mid].x <= uv.x) lo = mid;\n    else hi = mid-1;\n}\n"
+        otext += "for(int k=max(lo-"+str(overlap-1)+",0); k<=lo; ++k)\n{\n"
+        otext += "    if(uv.x < ext[k].x || uv.x > ext[k].y) continue;\n"
+    else :
+        otext += "for(int k=0; k<"+n+"; ++k)\n{\n"
+    otext += "    int g = int(inst[k].x);\n    vec2 o = vec2(inst[k].y, "+"%.2e"%(ypos * unit)+");\n"
+    if lin != [] :
+        otext += "    for(int i=lins[g]; i<lins[g+1]; i+=2) d=min(d,dsg(lin[i]+o, lin[i+1]+o, uv));\n"
+    if quad != [] :
+        otext += "    for(int i=quads[g]; i<quads[g+1]; i+=3) d=min(d,dsp(quad[i]+o, quad[i+1]+o, quad[i+2]+o, uv));\n"
+    otext += "}\n"
+    return otext
+
+if __name__ == '__main__':
+    # parse command line
+    parser = argparse.ArgumentParser(description='Shader Text Generation Tool.')
+    #parser.add_argument('-f', '--fontfile', dest='fontfile')
+    parser.add_argument('-s', '--size', dest='size')
+    parser.add_argument('-o', '--output', dest='outfile')
+    parser.add_argument('-p', '--plot', dest='plot', action='store_true')
+    parser.add_argument('-x', '--xoffset', dest='xoffset')
+    parser.add_argument('-y', '--yoffset', dest='yoffset')
+    parser.add_argument('-i', '--instances', dest='instances', action='store_true', help='Emit every glyph once plus a list of glyph instances.')
+    parser.add_argument('-c', '--cull', dest='cull', action='store_true', help='Only evaluate the glyph instances whose x extent contains the pixel; implies --instances.')
+    parser.add_argument('-m', '--margin', dest='margin', type=float, default=.5, help='Margin around the glyph extents for --cull, in glyph units.')
+    args, rest = parser.parse_known_args()
+
+    text = rest[0]
+    unit = float(args.size)/6.
+
+    # compute outlines
+    xpos = 0.
+    ypos = 0.
+    if args.xoffset != None :
+        xpos = float(args.xoffset[1:-1])/unit
+    if args.yoffset != None :
+        ypos = float(args.yoffset[1:-1])/unit
+    lin, quad = outlines(text, unit, xpos, ypos)
+
+    # plot outlines
+    if args.plot :
+        plot(lin, quad, unit)
+
+    if args.instances or args.cull :
+        otext = glsl_instances(text, unit, xpos, ypos, args.cull, args.margin)
+    else :
+        otext = glsl(lin, quad)
+    if args.outfile == None :
+        print(otext)
+    else :
+        with open(args.outfile, "wt") as f:
+            f.write(otext)
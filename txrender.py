@@ -0,0 +1,476 @@
+# txrender - reference renderer for tx210 font textures
+# Copyright (C) 2017/2018 Alexander Kraus <nr4@z10.info>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# The texture is decoded like rshort, glyphoffset and dglyph in gfx.frag do:
+# every glyph record is walked once, in the order of the shader, and turned
+# into the lines and quadratic splines the shader would evaluate. The signed
+# distance to them is then computed for many pixels at once with the
+# distance functions of txsdf. Coordinates are those of the shader, i.e.
+# glyph points are offset by the short range offset and scaled by
+# size/65536. Rays of the crossing count start exactly at the pixel, like in
+# the shader.
+# Every pixel is evaluated against every segment of its glyph, so the cost
+# grows with pixels times segments: the 95 glyph ASCII sheet of DejaVu Sans
+# takes about 4 to 5 seconds at 1024x1024 on one core. Textures with
+# bounding boxes (tx210 -b) skip the segments for pixels outside the box
+# and render the same sheet in about 0.6 seconds.
+
+import argparse
+import numpy as np
+import re
+import struct
+import sys
+import tx210
+import txsdf
+import zlib
+
+# Notify and quit
+def close(str):
+    print(str)
+    exit()
+
+# Start of the section of font in texture and its header. Textures without
+# font table hold font 0 only. Returns -1 for fonts that are not present.
+def font_section(texture, font=0):
+    header = int(texture[0])
+    if header >= tx210.header_flag and header & tx210.fonts_flag:
+        if font >= int(texture[1]):
+            return -1, 0
+        start = int(texture[2+font])
+        return start, int(texture[start])
+    return (0, header) if font == 0 else (-1, 0)
+
+# Find the offset of the glyph data for the code point of font in the glyph
+# index or return -1 if the glyph is not present
+def glyph_offset(texture, code, font=0):
+    start, header = font_section(texture, font)
+    if start == -1:
+        return -1
+    base = start
+    type = 0
+    if header >= tx210.header_flag:
+        base = start+1
+        type = header & 15
+
+    # Direct-mapped table
+    if type == 1:
+        i = code-int(texture[base])
+        if i < 0 or i >= int(texture[base+1]):
+            return -1
+        off = int(texture[base+2+i])
+        return off if off != 0 else -1
+
+    # Two-level paged table
+    if type == 2:
+        shift = int(texture[base])
+        page = (code >> shift)-int(texture[base+1])
+        if page < 0 or page >= int(texture[base+2]):
+            return -1
+        leaf = int(texture[base+3+page])
+        if leaf == 0:
+            return -1
+        off = int(texture[leaf+(code & ((1 << shift)-1))])
+        return off if off != 0 else -1
+
+    # Linear scan, one entry after the other like the shader
+    nchars = int(texture[base])
+    for i in range(nchars):
+        if int(texture[base+1+2*i]) == code:
+            return int(texture[base+2+2*i])
+    return -1
+
+# Short range offset with the sign stored separately
+def read_offset(texture, off):
+    return np.array([ -1. if texture[off] else 1., -1. if texture[off+2] else 1. ])*[ texture[off+1], texture[off+3] ]
+
+# Walk a contour of points that starts with an on-curve point the way
+# dpacked and dpooled do, resolving the implicit on-curve midpoints.
+def walk_contour(points, tags, lines, quads):
+    first = last = control = points[0]
+    pending = False
+    for q, tag in zip(points[1:], tags[1:]):
+        if tag == 1:
+            if pending:
+                quads += [ np.concatenate((last, control, q)) ]
+            else:
+                lines += [ np.concatenate((last, q)) ]
+            last = q
+            pending = False
+        else:
+            if pending:
+                m = .5*(control+q)
+                quads += [ np.concatenate((last, control, m)) ]
+                last = m
+            control = q
+            pending = True
+    # Close the contour
+    if pending:
+        quads += [ np.concatenate((last, control, first)) ]
+    else:
+        lines += [ np.concatenate((last, first)) ]
+
+# Run the stack machine of dglyph over the contours of a points record
+def stack_machine(points, tags, contours, lines, quads):
+    istart = 0
+    for iend in contours:
+        stack = []
+        j = istart
+        while j <= iend:
+            stack += [ (tags[j], points[j]) ]
+            # Check if line segment is finished
+            if len(stack) == 2 and stack[0][0]*stack[1][0] == 1:
+                lines += [ np.concatenate((stack[0][1], stack[1][1])) ]
+                j -= 1
+                stack = []
+            elif len(stack) == 3:
+                if stack[0][0]*stack[2][0] == 1:
+                    quads += [ np.concatenate((stack[0][1], stack[1][1], stack[2][1])) ]
+                    stack = []
+                else:
+                    p = .5*(stack[1][1]+stack[2][1])
+                    quads += [ np.concatenate((stack[0][1], stack[1][1], p)) ]
+                    stack = [ (1, p) ]
+                j -= 1
+            j += 1
+        stack += [ (tags[istart], points[istart]) ]
+        if len(stack) == 2:
+            lines += [ np.concatenate((stack[0][1], stack[1][1])) ]
+        elif len(stack) == 3:
+            quads += [ np.concatenate((stack[0][1], stack[1][1], stack[2][1])) ]
+        istart = iend+1
+
+# Decode the glyph record of the code point of font. Returns None for glyphs that are
+# not in the index and otherwise a dict with the record 'format', the glyph
+# outline as 'lines' (rows x0,y0,x1,y1) and 'quads' (rows x0,y0,x1,y1,x2,y2)
+# in glyph points relative to the origin, the bounding box corners 'lower'
+# and 'upper' if the texture stores them (None otherwise), and for the sdf
+# format the field 'origin', 'cell', 'spread' and atlas rectangle 'rect'.
+def decode_glyph(texture, code, font=0):
+    off = glyph_offset(texture, code, font)
+    if off == -1:
+        return None
+    return decode_record(texture, off, font_section(texture, font)[1])
+
+# Decode the glyph record at off of a font with header header, like drecord
+def decode_record(texture, off, header):
+    format = (header >> 4) & 15 if header >= tx210.header_flag else 0
+    glyph = { 'format': tx210.record_formats[format], 'lower': None, 'upper': None }
+    lines = [ np.zeros((0,4)) ]
+    quads = [ np.zeros((0,6)) ]
+
+    if header >= tx210.header_flag and header & tx210.bbox_flag:
+        # Bit packed records fold the sign into the offset
+        if format == 3:
+            glyph['lower'] = texture[off+2:off+4].astype(float)-32768.
+        else:
+            glyph['lower'] = read_offset(texture, off+2)
+        glyph['upper'] = glyph['lower'] + texture[off:off+2]
+        off += 2
+
+    if format == 1:
+        dx = read_offset(texture, off)
+        nlines, nquads = int(texture[off+4]), int(texture[off+5])
+        loff = off+6
+        qoff = loff+4*nlines
+        lines += [ .5*texture[loff:qoff].reshape(-1,4) + np.tile(dx, 2) ]
+        quads += [ .5*texture[qoff:qoff+6*nquads].reshape(-1,6) + np.tile(dx, 3) ]
+    elif format == 2:
+        glyph['origin'] = read_offset(texture, off)
+        glyph['cell'] = float(texture[off+4])
+        glyph['spread'] = float(texture[off+5])*glyph['cell']
+        glyph['rect'] = texture[off+6:off+10].astype(int)
+    elif format == 3:
+        record = tx210.decode_packed(texture, off)
+        points = np.stack([ record['x'], record['y'] ], axis=1) + [ record['dx'], record['dy'] ]
+        istart = 0
+        for iend in record['contours']:
+            walk_contour(points[istart:iend+1], record['tags'][istart:iend+1], lines, quads)
+            istart = iend+1
+    elif format == 4:
+        dx = read_offset(texture, off)
+        for i in range(int(texture[off+4])):
+            roff = off+5+3*i
+            coff = int(texture[roff])
+            npts = int(texture[coff])
+            points = np.stack([ texture[coff+1:coff+1+npts], texture[coff+1+npts:coff+1+2*npts] ], axis=1) + dx + texture[roff+1:roff+3]
+            walk_contour(points, texture[coff+1+2*npts:coff+1+3*npts], lines, quads)
+    else:
+        dx = read_offset(texture, off)
+        npts = int(texture[off+4])
+        xoff = off+5
+        yoff = off+6+npts
+        toff = off+7+2*npts
+        coff = off+8+3*npts
+        points = np.stack([ texture[xoff:xoff+npts], texture[yoff:yoff+npts] ], axis=1) + dx
+        stack_machine(points, texture[toff:toff+npts].astype(int), texture[coff:coff+int(texture[coff-1])].astype(int), lines, quads)
+
+    glyph['lines'] = np.concatenate([ np.reshape(l, (-1,4)) for l in lines ])
+    glyph['quads'] = np.concatenate([ np.reshape(q, (-1,6)) for q in quads ])
+    return glyph
+
+# Bilinear lookup of the atlas at continuous texel coordinates s (rows x,y),
+# with texel centers at integer coordinates and clamping at the edges like
+# a linearly filtered texture
+def sample_atlas(atlas, s):
+    h, w = atlas.shape
+    s = np.clip(s, 0., [ w-1, h-1 ])
+    i = np.minimum(np.floor(s).astype(int), [ w-2, h-2 ]) if min(w, h) > 1 else np.floor(s).astype(int)
+    f = s-i
+    i1 = np.minimum(i+1, [ w-1, h-1 ])
+    v = atlas.astype(float)/255.
+    return ((1.-f[:,0])*(1.-f[:,1])*v[i[:,1],i[:,0]] + f[:,0]*(1.-f[:,1])*v[i[:,1],i1[:,0]]
+        + (1.-f[:,0])*f[:,1]*v[i1[:,1],i[:,0]] + f[:,0]*f[:,1]*v[i1[:,1],i1[:,0]])
+
+# Signed distance of the points x (rows x,y in shader coordinates) to the
+# decoded glyph, as returned by dglyph. Points further than bboxmargin from
+# the bounding box get the box distance. Points are processed in chunks of
+# chunksize to bound the memory of the pairwise distance arrays.
+def glyph_distance(x, glyph, size=1., atlas=None, bboxmargin=.01, chunksize=1<<13):
+    if glyph == None:
+        return np.ones(len(x))
+    scale = size/65536.
+    d = np.empty(len(x))
+    exact = np.ones(len(x), dtype=bool)
+    if glyph['lower'] is not None:
+        db = np.linalg.norm(np.maximum(np.maximum(glyph['lower']*scale-x, x-glyph['upper']*scale), 0.), axis=1)
+        exact = db <= bboxmargin
+        d[~exact] = db[~exact]
+    xe = x[exact]
+
+    if glyph['format'] == 'sdf':
+        # Position on the sample grid
+        g = glyph['rect'][2:]
+        s = (xe/scale-glyph['origin'])/glyph['cell']
+        sc = np.clip(s, 0., g-1.)
+        de = (255.*sample_atlas(atlas, glyph['rect'][:2]+sc)-128.)/127.*glyph['spread'] + np.linalg.norm(s-sc, axis=1)*glyph['cell']
+        d[exact] = de*scale
+        return d
+
+    lines = glyph['lines']*scale
+    quads = glyph['quads']*scale
+    de = np.empty(len(xe))
+    for i in range(0, len(xe), chunksize):
+        de[i:i+chunksize] = txsdf.signed_distance(xe[i:i+chunksize], lines, quads, 0.)
+    # The shader starts from distance 1
+    d[exact] = np.where(de < 0., -1., 1.)*np.minimum(np.abs(de), 1.)
+    return d
+
+# Render the glyphs of text of font on a square sheet of resolution pixels like
+# mainImage in gfx.frag: the sheet is split into square tiles, every glyph
+# has its origin in the center of a tile and its size scales with the tile.
+# Glyphs are placed row by row from the top left. Returns the signed
+# distance of every pixel as (resolution, resolution) array, first row on top.
+def render(texture, text, resolution=1024, columns=None, atlas=None, font=0):
+    texture = np.asarray(texture)
+    if columns == None:
+        columns = max(1, int(np.ceil(np.sqrt(len(text)))))
+    a = 1./columns
+    size = 5.4*a
+    bboxmargin = 1.e-3+1.5/resolution
+
+    # Pixel centers, y pointing up
+    u = (np.arange(resolution)+.5)/resolution
+    tile = np.minimum((u/a).astype(int), columns-1)
+    image = np.ones((resolution, resolution))
+    for i, char in enumerate(text):
+        row, column = divmod(i, columns)
+        ix = np.nonzero(tile == column)[0]
+        iy = np.nonzero(tile[::-1] == columns-1-row)[0]
+        if len(ix) == 0 or len(iy) == 0:
+            continue
+        gx, gy = np.meshgrid(u[ix]-(column+.5)*a, u[::-1][iy]-(columns-row-.5)*a)
+        x = np.stack([ gx.ravel(), gy.ravel() ], axis=1)
+        d = glyph_distance(x, decode_glyph(texture, ord(char), font), size, atlas, bboxmargin)
+        image[np.ix_(iy, ix)] = d.reshape(len(iy), len(ix))
+    return image
+
+# Signed distance of the points x to the text of the instance table at table,
+# like dtext: every point is matched with the glyph instance of its line
+# whose pen position is the last one left of it, and gets the least distance
+# to that instance and its neighbours.
+def text_distance(x, texture, table, size=1., atlas=None, bboxmargin=.01):
+    texture = np.asarray(texture)
+    unit = size/65536.
+    nlines = int(texture[table])
+    d = np.ones(len(x))
+    if nlines == 0:
+        return d
+    lineheight = float(texture[table+1])*unit
+    line = np.clip(np.floor((float(texture[table+2])*unit-x[:,1])/lineheight), 0, nlines-1).astype(int)
+    header = font_section(texture, 0)[1]
+    for i in range(nlines):
+        loff = int(texture[table+3+i])
+        n = int(texture[loff])
+        rows = np.nonzero(line == i)[0]
+        if n == 0 or len(rows) == 0:
+            continue
+        instances = texture[loff+1:loff+1+3*n].reshape(-1,3).astype(int)
+        pens = (instances[:,1]+instances[:,2]/65536.)*size
+        xl = x[rows] + [ 0., i*lineheight ]
+        k = np.maximum(np.searchsorted(pens, xl[:,0], side='right')-1, 0)
+        for j in range(n):
+            near = np.nonzero(np.abs(k-j) <= 1)[0]
+            if len(near) != 0:
+                glyph = decode_record(texture, instances[j,0], header)
+                d[rows[near]] = np.minimum(d[rows[near]], glyph_distance(xl[near]-[ pens[j], 0. ], glyph, size, atlas, bboxmargin))
+    return d
+
+# Render the text of the instance table at table on a sheet of resolution
+# pixels across, with the lines filling its width of one unit. Returns the
+# signed distance of every pixel as (rows, resolution) array, first row on
+# top.
+def render_text(texture, table, resolution=1024, atlas=None):
+    texture = np.asarray(texture)
+    nlines = int(texture[table])
+    lineheight, ascent = float(texture[table+1]), float(texture[table+2])
+    # Text extent in glyph units, up to a line height past the last pen position
+    width = lineheight
+    for i in range(nlines):
+        loff = int(texture[table+3+i])
+        n = int(texture[loff])
+        if n != 0:
+            width = max(width, 65536.*texture[loff+3*n-1]+texture[loff+3*n]+lineheight)
+    height = max(nlines, 1)*lineheight
+    rows = max(1, int(round(resolution*height/width)))
+    u = (np.arange(resolution)+.5)/resolution
+    v = (ascent-(np.arange(rows)+.5)/resolution*width)/width
+    gx, gy = np.meshgrid(u, v)
+    x = np.stack([ gx.ravel(), gy.ravel() ], axis=1)
+    d = text_distance(x, texture, table, 65536./width, atlas, 1.e-3+1.5/resolution)
+    return d.reshape(rows, resolution)
+
+# Shade the distances like mainImage: dark inside the glyphs (or on their
+# outline for a stroke width w) with an antialiased edge of 1.5 pixels
+def shade(d, w=None):
+    if w != None:
+        d = np.abs(d)-w
+    e = 1.5/d.shape[1]
+    t = np.clip((d+e)/(2.*e), 0., 1.)
+    return np.round(255.*t*t*(3.-2.*t)).astype(np.uint8)
+
+# Write a grayscale image as binary PGM or, for names ending in .png, as PNG
+def write_image(filename, image):
+    h, w = image.shape
+    if filename.lower().endswith('.png'):
+        def chunk(tag, data):
+            return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag+data) & 0xffffffff)
+        raw = b''.join(b'\0' + row.tobytes() for row in image)
+        data = b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, 8, 0, 0, 0, 0)) + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b'')
+    else:
+        data = 'P5\n{:d} {:d}\n255\n'.format(w, h).encode('ascii') + image.tobytes()
+    with open(filename, 'wb') as f:
+        f.write(data)
+
+# Load the font texture and distance field atlas from a tx210 output file:
+# a raw binary texture, a .npy array (with the atlas in <name>_sdf.npy) or a
+# C header
+def load_texture(filename):
+    format = tx210.output_format(filename)
+    if format == 'bin':
+        header, texture, atlas = tx210.load_binary(filename)
+        return texture, atlas
+    if format == 'npy':
+        texture = np.load(filename)
+        try:
+            atlas = np.load(tx210.sdf_npy_name(filename))
+        except OSError:
+            atlas = None
+        return texture, atlas
+    with open(filename, 'rt') as f:
+        source = f.read()
+    arrays = dict(re.findall(r'(font_texture|font_sdf)\[\d*\]\s*=\s*\{([^}]*)\}', source))
+    if 'font_texture' not in arrays:
+        raise tx210.PackError("No font_texture found in " + filename)
+    texture = np.array(arrays['font_texture'].split(','), dtype=int).astype(tx210.fmt)
+    atlas = None
+    if 'font_sdf' in arrays:
+        width = int(re.search(r'font_sdf_width\s*=\s*(\d+)', source).group(1))
+        atlas = np.array(arrays['font_sdf'].split(','), dtype=int).astype(np.uint8).reshape(-1, width)
+    return texture, atlas
+
+# Offset of the instance table of laid out text in a tx210 output file, or
+# None if it has none: the binary header field or font_instances_offset of
+# the C header
+def load_instances_offset(filename):
+    format = tx210.output_format(filename)
+    if format == 'bin':
+        offset = tx210.load_binary(filename)[0].get('instances_offset', 0)
+        return offset if offset != 0 else None
+    if format == 'npy':
+        return None
+    with open(filename, 'rt') as f:
+        match = re.search(r'font_instances_offset\s*=\s*(\d+)', f.read())
+    return int(match.group(1)) if match != None else None
+
+# Code points of all glyphs in the index of font in texture
+def glyph_codes(texture, font=0):
+    start, header = font_section(texture, font)
+    if start == -1:
+        return []
+    base = start+int(header >= tx210.header_flag)
+    type = header & 15 if base != start else 0
+    if type == 0:
+        return texture[base+1:base+1+2*int(texture[base]):2].astype(int).tolist()
+    if type == 1:
+        first, count = int(texture[base]), int(texture[base+1])
+        return (first+np.nonzero(texture[base+2:base+2+count])[0]).tolist()
+    shift, first, npages = int(texture[base]), int(texture[base+1]), int(texture[base+2])
+    codes = []
+    for page in range(npages):
+        leaf = int(texture[base+3+page])
+        if leaf != 0:
+            codes += (((first+page) << shift) + np.nonzero(texture[leaf:leaf+(1 << shift)])[0]).tolist()
+    return codes
+
+def main():
+    parser = argparse.ArgumentParser(description='Reference renderer for tx210 font textures.')
+    parser.add_argument('-i', '--input', dest='infile', help='Font texture as C header, .bin or .npy file.')
+    parser.add_argument('-o', '--output', dest='outfile', help='Image (.pgm or .png) or distance array (.npy).')
+    parser.add_argument('-r', '--resolution', dest='resolution', type=int, default=1024, help='Side length of the sheet in pixels.')
+    parser.add_argument('-n', '--font', dest='font', type=int, default=0, help='Font to render from a texture with several fonts.')
+    parser.add_argument('-L', '--lines', dest='lines', action='store_true', help='Render the laid out text of the instance table instead of a glyph sheet.')
+    parser.add_argument('-s', '--stroke', dest='stroke', type=float, help='Shade the outlines with this stroke width instead of filling the glyphs.')
+    args, rest = parser.parse_known_args()
+
+    if args.infile == None:
+        close("No font texture specified. Doing nothing.")
+    if args.outfile == None:
+        close("No output file specified. Doing nothing.")
+    texture, atlas = load_texture(args.infile)
+    if args.lines:
+        table = load_instances_offset(args.infile)
+        if table == None:
+            close("No instance table found in " + args.infile)
+        print("Rendering {:d} lines at {:d} pixels across.".format(int(texture[table]), args.resolution))
+        d = render_text(texture, table, args.resolution, atlas)
+    else:
+        if rest != []:
+            text = rest[0]
+        else:
+            text = ''.join(chr(code) for code in glyph_codes(texture, args.font))
+        print("Rendering {:d} glyphs at {:d}x{:d} pixels.".format(len(text), args.resolution, args.resolution))
+        d = render(texture, text, args.resolution, atlas=atlas, font=args.font)
+    if args.outfile.lower().endswith('.npy'):
+        np.save(args.outfile, d)
+    else:
+        write_image(args.outfile, shade(d, args.stroke))
+
+if __name__ == '__main__':
+    try:
+        main()
+    except tx210.PackError as e:
+        print(e)
+        sys.exit(1)
@@ -0,0 +1,183 @@
+# txsdf - signed distance field atlas generation for tx210
+# Copyright (C) 2017/2018 Alexander Kraus <nr4@z10.info>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# The distance functions evaluate the math of gfx.frag's lineseg, spline2 and
+# intersector for many sample points at once. Points x have shape (n,2),
+# segment control points have shape (m,2) and the results have shape (n,m).
+# Where the shader divides by zero for degenerate splines, the limit of the
+# expression is used instead.
+
+import numpy as np
+
+# Distance to line segments. Coordinates are handled separately, which
+# keeps the (n,m) temporaries contiguous.
+def lineseg(x, p1, p2):
+    d = p2-p1
+    kx = x[:,0,None]-p1[:,0]
+    ky = x[:,1,None]-p1[:,1]
+    dd = np.sum(d*d, axis=-1)
+    t = np.clip((kx*d[:,0]+ky*d[:,1])/np.where(dd == 0., 1., dd), 0., 1.)
+    kx -= t*d[:,0]
+    ky -= t*d[:,1]
+    return np.sqrt(kx*kx+ky*ky)
+
+# Squared distance to quadratic bezier splines with parameter t
+def dist2(p0, p1, p2, x, t):
+    t = np.clip(t, 0., 1.)
+    a = (1.-t)**2
+    b = 2.*(1.-t)*t
+    c = t*t
+    dx = x[:,0,None]-a*p0[:,0]-b*p1[:,0]-c*p2[:,0]
+    dy = x[:,1,None]-a*p0[:,1]-b*p1[:,1]-c*p2[:,1]
+    return dx*dx+dy*dy
+
+# Minimum distance to quadratic bezier splines
+def spline2(p0, p1, p2, x):
+    # Coefficients for 0 = t^3 + a * t^2 + b * t + c
+    E = x[:,None,:]-p0[None,:,:]
+    F = p2-2.*p1+p0
+    G = p1-p0
+    FF = np.sum(F*F, axis=-1)
+    line = FF == 0.
+    FF = np.where(line, 1., FF)
+    a = 3.*np.sum(G*F, axis=-1)/FF
+    b = (2.*np.sum(G*G, axis=-1)-np.sum(E*F, axis=-1))/FF
+    c = -np.sum(E*G, axis=-1)/FF
+
+    # Discriminant and helpers
+    tau = a/3.
+    p = b-tau*a
+    q = -tau*(tau*tau+p)+c
+    dis = q*q/4.+p*p*p/27.
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Single real root
+        sq = np.sqrt(np.maximum(dis, 0.))
+        ki = np.stack([ -.5*q+sq, -.5*q-sq ])
+        ui = np.sign(ki)*np.abs(ki)**(1./3.)
+        t1 = ui[0]+ui[1]-tau
+
+        # Three distinct real roots
+        fac = np.sqrt(np.maximum(-4./3.*p, 0.))
+        arg = np.arccos(np.clip(-.5*q*np.sqrt(-27./(p*p*p)), -1., 1.))/3.
+        t3 = [ -fac*np.cos(arg+np.pi/3.)-tau, fac*np.cos(arg)-tau, -fac*np.cos(arg-np.pi/3.)-tau ]
+
+    # A vanishing p means a triple root at -tau
+    t3 = [ np.where(np.isnan(t), -tau, t) for t in t3 ]
+    d = np.sqrt(np.where(dis > 0., dist2(p0, p1, p2, x, t1),
+        np.minimum(dist2(p0, p1, p2, x, t3[0]),
+            np.minimum(dist2(p0, p1, p2, x, t3[1]), dist2(p0, p1, p2, x, t3[2])))))
+    # Splines with collinear, equidistant control points are lines
+    return np.where(line, lineseg(x, p0, p2), d)
+
+# Number of crossings of a ray from x to the right with line segments
+def intersector(p0, p1, x):
+    k = x[:,None,:]-p0[None,:,:]
+    d = p1-p0
+    inside = (np.minimum(p0[:,1], p1[:,1]) <= x[:,None,1]) & (x[:,None,1] <= np.maximum(p0[:,1], p1[:,1])) & (d[:,1] != 0.)
+    beta = k[:,:,1]/np.where(d[:,1] == 0., 1., d[:,1])
+    alpha = d[:,0]*beta-k[:,:,0]
+    return (inside & (beta >= 0.) & (beta <= 1.) & (alpha >= 0.)).astype(int)
+
+# Number of crossings of a ray from x to the right with quadratic splines
+def intersector2(p0, p1, p2, x):
+    # Compute coefficients for quadratic equation
+    a = (p2[:,1]-2.*p1[:,1]+p0[:,1])[None,:]
+    b = (2.*p1[:,1]-2.*p0[:,1])[None,:]
+    C = p0[None,:,1]-x[:,None,1]
+
+    # Discriminant
+    dis = b*b-4.*a*C
+    quadratic = a != 0.
+    a = np.where(quadratic, a, 1.)
+    sq = np.sqrt(np.maximum(dis, 0.))
+
+    # Solutions; splines that are linear in y have a single one
+    t = np.stack([ (-b+sq)/2./a, (-b-sq)/2./a ])
+    t[0] = np.where(quadratic, np.where(dis == 0., -b/2./a, t[0]), -C/np.where(b == 0., 1., b))
+    valid = np.stack([ np.where(quadratic, dis >= 0., b != 0.), quadratic & (dis > 0.) ])
+    alpha = (1.-t)**2*p0[:,0]+2.*(1.-t)*t*p1[:,0]+t*t*p2[:,0]-x[:,None,0]
+    return np.sum(valid & (t >= 0.) & (t <= 1.) & (alpha >= 0.), axis=0)
+
+# Signed distance to the glyph outline made of lines (rows x0,y0,x1,y1) and
+# quads (rows x0,y0,x1,y1,x2,y2). Points with an odd number of crossings are
+# inside and get negative distances. Glyphs without segments are infinitely
+# far away. The rays start slightly above x, so they never pass exactly
+# through the outline points on the integer grid, where the shader's closed
+# segment ranges would count a crossing twice.
+def signed_distance(x, lines, quads, epsilon=1.e-3):
+    xs = x+[ 0., epsilon ]
+    lines = np.asarray(lines, dtype=float).reshape(-1, 4)
+    quads = np.asarray(quads, dtype=float).reshape(-1, 6)
+    d = np.full(len(x), np.inf)
+    n = np.zeros(len(x), dtype=int)
+    if len(lines) != 0:
+        p0, p1 = lines[:,:2], lines[:,2:]
+        d = np.minimum(d, lineseg(x, p0, p1).min(axis=1))
+        n += intersector(p0, p1, xs).sum(axis=1)
+    if len(quads) != 0:
+        p0, p1, p2 = quads[:,:2], quads[:,2:4], quads[:,4:]
+        d = np.minimum(d, spline2(p0, p1, p2, x).min(axis=1))
+        n += intersector2(p0, p1, p2, xs).sum(axis=1)
+    return np.where(n % 2 == 1, -d, d)
+
+# Sample the signed distance of every glyph on a grid and pack the quantized
+# fields into one atlas. records need the segments of resolve_segments (in
+# half units) and the glyph coordinates x and y. The grid spacing cell is the
+# integer number of points that fits samples samples across the largest
+# glyph extent; every field has pad extra samples on each side, and the
+# distance range [-pad*cell, pad*cell] is mapped to the bytes [1, 255] with
+# 128 on the outline. Returns copies of the records with cell, pad and the
+# atlas rectangle ax, ay, gw, gh added, and the atlas as (height, width)
+# uint8 array with a width divisible by four.
+def build_atlas(records, samples=64, pad=4):
+    extent = max([ max(record['x'].max(), record['y'].max()) for record in records if len(record['x']) != 0 ] + [ 1 ])
+    cell = max(1, int(np.ceil(extent/float(samples-2*pad-1))))
+    spread = float(pad*cell)
+
+    fields = []
+    for record in records:
+        w = int(record['x'].max()) if len(record['x']) != 0 else 0
+        h = int(record['y'].max()) if len(record['y']) != 0 else 0
+        gw = int(np.ceil(w/float(cell)))+2*pad+1
+        gh = int(np.ceil(h/float(cell)))+2*pad+1
+        gx, gy = np.meshgrid((np.arange(gw)-pad)*cell, (np.arange(gh)-pad)*cell)
+        x = np.stack([ gx.ravel(), gy.ravel() ], axis=1).astype(float)
+        d = signed_distance(x, .5*record['lines'], .5*record['quads'])
+        fields += [ np.clip(np.round(128.+d/spread*127.), 1, 255).astype(np.uint8).reshape(gh, gw) ]
+
+    # Shelf packing, highest fields first
+    area = sum(field.size for field in fields)
+    width = max([ int(np.ceil(np.sqrt(area))) ] + [ field.shape[1] for field in fields ])
+    width += (-width) % 4
+    rects = [ None ] * len(fields)
+    x = y = shelf = 0
+    for i in sorted(range(len(fields)), key=lambda i: -fields[i].shape[0]):
+        gh, gw = fields[i].shape
+        if x+gw > width:
+            x = 0
+            y += shelf
+            shelf = 0
+        rects[i] = (x, y)
+        x += gw
+        shelf = max(shelf, gh)
+    atlas = np.zeros((y+shelf, width), dtype=np.uint8)
+
+    result = []
+    for record, field, (ax, ay) in zip(records, fields, rects):
+        atlas[ay:ay+field.shape[0], ax:ax+field.shape[1]] = field
+        result += [ dict(record, cell=cell, pad=pad, ax=ax, ay=ay, gw=field.shape[1], gh=field.shape[0]) ]
+    return result, atlas
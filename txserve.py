@@ -0,0 +1,206 @@
+# txserve - tx210 build service with warm font faces
+# Copyright (C) 2017/2018 Alexander Kraus <nr4@z10.info>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# The service reads build requests as JSON objects, one per line, from stdin
+# or from the connections of a Unix socket, and answers each with one JSON
+# line. Requests hold
+#     font: font file name (required)
+#     text: characters to pack, the printable ascii characters by default
+#     output: output file name; without it the texture is sent back
+#     format: output file format as for tx210 --output-format
+#     index, records, bbox, layout, tolerance, cubic_tolerance, sdf_samples,
+#     sdf_pad: as for tx210
+#     lines: list of text lines to lay out into an instance table, as for
+#         tx210 --line; their characters are packed as well
+# Requests with fields of the wrong type are refused before building.
+# Replies hold ok and either error or the number of glyphs, the texture
+# bytes, font_texture_size (and texture_shape for integer layouts), the
+# build time in seconds, the glyph record hits and misses and, with lines,
+# the instances_offset of the table. Without output, the texture (and the
+# sdf atlas with its width) is sent as base64 encoded little endian data.
+# Font faces stay open and their glyph records stay in memory, so a rebuild
+# only has to extract the glyphs it has not seen before. Fonts are reopened
+# when their file changes.
+
+import argparse
+import base64
+import freetype
+import io
+import json
+import os
+import signal
+import sys
+import time
+import traceback
+import tx210
+
+# Glyph records in memory, with the interface of txcache.GlyphCache
+class MemoryCache:
+    def __init__(self):
+        self.records = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, char):
+        record = self.records.get(char)
+        if record is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return record
+
+    def put(self, char, record):
+        self.records[char] = record
+
+    def evict(self):
+        pass
+
+    def report(self):
+        return "Glyph records: {:d} hits, {:d} misses.".format(self.hits, self.misses)
+
+# Open font faces and their glyph records by font file name
+class Fonts:
+    def __init__(self):
+        self.fonts = {}
+
+    # Return face and record cache of fontfile for the cubic tolerance; both
+    # are new if the file changed since it was opened
+    def get(self, fontfile, cubictolerance):
+        stat = os.stat(fontfile)
+        key = (stat.st_mtime_ns, stat.st_size)
+        if fontfile not in self.fonts or self.fonts[fontfile][0] != key:
+            self.fonts[fontfile] = (key, tx210.open_font(fontfile), {})
+        key, face, caches = self.fonts[fontfile]
+        if cubictolerance not in caches:
+            caches[cubictolerance] = MemoryCache()
+        return face, caches[cubictolerance]
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def is_count(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+# Checks of the optional request fields and the values they take
+request_fields = {
+    'text': (lambda v: isinstance(v, str), "a string"),
+    'output': (lambda v: isinstance(v, str), "a file name"),
+    'format': (lambda v: v in tx210.output_formats, "one of " + ", ".join(tx210.output_formats)),
+    'index': (lambda v: v in tx210.index_types+['auto'], "one of " + ", ".join(tx210.index_types+['auto'])),
+    'records': (lambda v: v in tx210.record_formats, "one of " + ", ".join(tx210.record_formats)),
+    'bbox': (lambda v: isinstance(v, bool), "true or false"),
+    'layout': (lambda v: v in tx210.texture_layouts, "one of " + ", ".join(tx210.texture_layouts)),
+    'tolerance': (lambda v: v is None or is_number(v) and v > 0, "a positive number"),
+    'cubic_tolerance': (lambda v: is_number(v) and v > 0, "a positive number"),
+    'sdf_samples': (lambda v: is_count(v) and v > 0, "a positive integer"),
+    'sdf_pad': (lambda v: is_count(v) and v >= 0, "a non-negative integer"),
+    'lines': (lambda v: isinstance(v, list) and all(isinstance(line, str) for line in v), "a list of strings"),
+}
+
+# Error message of a request with a missing font or malformed fields, or None
+def check_request(request):
+    if not isinstance(request, dict) or not isinstance(request.get('font'), str):
+        return "Requests need a font file."
+    for name, (check, values) in request_fields.items():
+        if name in request and not check(request[name]):
+            return "Request field " + name + " has to be " + values + "."
+    return None
+
+# Build the texture of request and return the reply
+def handle(fonts, request):
+    error = check_request(request)
+    if error != None:
+        return { 'ok': False, 'error': error }
+    try:
+        start = time.perf_counter()
+        cubictolerance = request.get('cubic_tolerance', tx210.cubic_tolerance)
+        face, cache = fonts.get(request['font'], cubictolerance)
+        hits, misses = cache.hits, cache.misses
+        text = request.get('text')
+        if 'lines' in request:
+            text = list(set((text if text != None else '') + ''.join(request['lines'])))
+        texture, meta = tx210.build_texture(face, text, request.get('index', 'linear'), request.get('records', 'points'), request.get('bbox', False), cache,
+            sdfsamples=request.get('sdf_samples', 64), sdfpad=request.get('sdf_pad', 4), tolerance=request.get('tolerance'), cubictolerance=cubictolerance)
+        if 'lines' in request:
+            texture, meta = tx210.add_instances(texture, meta, face, request['lines'])
+        texture, meta = tx210.layout_texture(texture, meta, request.get('layout', 'rgba8'))
+        if 'output' in request:
+            tx210.write_output(request['output'], texture, meta, request.get('format'))
+    # Textures that can not be built and fonts that can not be read
+    except (tx210.PackError, OSError, freetype.FT_Exception, ValueError, TypeError) as e:
+        return { 'ok': False, 'error': str(e) }
+    # Anything else is a bug; report it and keep serving
+    except Exception as e:
+        traceback.print_exc(file=sys.stderr)
+        return { 'ok': False, 'error': type(e).__name__ + ": " + str(e) }
+    reply = { 'ok': True, 'glyphs': len(meta['text']), 'bytes': int(texture.nbytes), 'texture_size': meta['texture_size'],
+        'time': time.perf_counter()-start, 'hits': cache.hits-hits, 'misses': cache.misses-misses }
+    if 'instances_offset' in meta:
+        reply['instances_offset'] = meta['instances_offset']
+    if 'texture_shape' in meta:
+        reply['texture_shape'] = meta['texture_shape']
+    if 'output' not in request:
+        reply['texture'] = base64.b64encode(texture.astype(tx210.fmt).tobytes()).decode('ascii')
+        if meta['atlas'] is not None:
+            reply['sdf'] = base64.b64encode(meta['atlas'].tobytes()).decode('ascii')
+            reply['sdf_width'] = meta['atlas'].shape[1]
+    return reply
+
+# Answer the requests of the lines of infile on outfile
+def serve_lines(fonts, infile, outfile):
+    for line in infile:
+        if line.strip() == '':
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            reply = { 'ok': False, 'error': 'Invalid request: ' + str(e) }
+        else:
+            reply = handle(fonts, request)
+        outfile.write(json.dumps(reply) + '\n')
+        outfile.flush()
+
+# Serve the connections of a Unix socket at path one after the other
+def serve_socket(fonts, path):
+    import socketserver
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            serve_lines(fonts, io.TextIOWrapper(self.rfile, encoding='utf-8'), io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True))
+
+    if os.path.exists(path):
+        os.remove(path)
+    with socketserver.UnixStreamServer(path, Handler) as server:
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='tx210 build service with warm font faces.')
+    parser.add_argument('-s', '--socket', dest='socket', help='Unix socket to listen on; requests are read from stdin otherwise.')
+    args, rest = parser.parse_known_args()
+
+    fonts = Fonts()
+    if args.socket != None:
+        # Remove the socket file on termination as well
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+        try:
+            serve_socket(fonts, args.socket)
+        except KeyboardInterrupt:
+            pass
+    else:
+        serve_lines(fonts, sys.stdin, sys.stdout)